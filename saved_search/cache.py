@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+_missing = object()
+
+
+class LRUCache(object):
+    """
+    A small, thread-safe, size-bounded in-process cache. The least recently
+    used entry is evicted once `maxsize` entries are held, and entries older
+    than `timeout` seconds, if given, are treated as missing.
+
+    """
+    def __init__(self, maxsize=1000, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Events of the get_or_set calls computing a value, by key, so that
+        # only callers wanting the same key wait for each other.
+        self._in_flight = {}
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        with self._lock:
+            if value is _missing:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.timeout is None:
+            expires = None
+        else:
+            expires = time.time() + self.timeout
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, func):
+        """
+        Return the value cached under `key`, calling `func` to compute and
+        cache it if there is none. Concurrent callers missing on the same
+        key wait for the first one's result rather than each calling `func`.
+        Exceptions raised by `func` propagate and nothing is cached.
+
+        """
+        while True:
+            value = self._lookup(key)
+            with self._lock:
+                if value is not _missing:
+                    self.hits += 1
+                    return value
+
+                event = self._in_flight.get(key)
+                if event is None:
+                    event = self._in_flight[key] = threading.Event()
+                    self.misses += 1
+                    break
+
+            # Another caller is computing the value; check again once it
+            # is done. If it failed, one of the waiters takes over.
+            event.wait()
+
+        try:
+            value = func()
+            self.set(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            event.set()
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def items(self):
+        """
+        Return the unexpired (key, value) pairs, least recently used first,
+        without marking any of them as used.
+
+        """
+        now = time.time()
+        with self._lock:
+            return [(key, value)
+                    for key, (expires, value) in self._data.items()
+                    if expires is None or expires > now]
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+    def _lookup(self, key):
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                return _missing
+            if expires is not None and expires <= time.time():
+                return _missing
+            # Re-insert so the key becomes the most recently used.
+            self._data[key] = (expires, value)
+            return value
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _missing
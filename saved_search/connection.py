@@ -0,0 +1,169 @@
+import threading
+from urllib import urlencode
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+
+try:
+    from concurrent import futures
+except ImportError:
+    futures = None
+
+from pysolr import Solr, SolrError
+
+# Connection pools and thread pools, shared by every backend instance of a
+# connection alias.
+_pools = {}
+_pools_lock = threading.Lock()
+_executors = {}
+
+
+class SolrServerError(SolrError):
+    """
+    A 5xx response from Solr. Unlike other Solr errors, which mean the
+    request itself was bad, these are worth retrying.
+
+    """
+    pass
+
+
+class SolrConnectionPool(object):
+    """
+    A requests session with a bounded pool of keep-alive connections to
+    Solr, and counters describing how it has been used.
+
+    """
+    def __init__(self, pool_size=10, pool_block=False):
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                                   pool_block=pool_block)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self._counts = {'requests': 0, 'retries': 0, 'failures': 0}
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def stats(self):
+        """
+        Returns the request, retry and failure counters, along with the
+        number of connections opened and requests served by each host's
+        pool.
+
+        """
+        stats = dict(self._counts, pool_size=self.pool_size, hosts={})
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            stats['hosts']['%s:%s' % (pool.host, pool.port)] = {
+                'connections': pool.num_connections,
+                'requests': pool.num_requests,
+            }
+        return stats
+
+
+def get_pool(connection_alias, **connection_options):
+    """
+    Returns the connection pool of a connection alias, creating it from
+    the alias' POOL_SIZE and POOL_BLOCK options if needed, or None if
+    requests is not installed.
+
+    """
+    if requests is None:
+        return None
+
+    with _pools_lock:
+        if connection_alias not in _pools:
+            _pools[connection_alias] = SolrConnectionPool(
+                pool_size=connection_options.get('POOL_SIZE', 10),
+                pool_block=connection_options.get('POOL_BLOCK', False))
+        return _pools[connection_alias]
+
+
+def get_executor(connection_alias, max_workers=10):
+    """
+    Returns the bounded thread pool searches of a connection alias are
+    dispatched to, creating it with `max_workers` threads if needed. On
+    Python 2 this requires the `futures` package.
+
+    """
+    if futures is None:
+        raise ImportError("Concurrent searches require concurrent.futures; "
+                          "install the 'futures' package on Python 2.")
+
+    with _pools_lock:
+        if connection_alias not in _executors:
+            _executors[connection_alias] = futures.ThreadPoolExecutor(
+                max_workers=max_workers)
+        return _executors[connection_alias]
+
+
+def encode_params(params):
+    """URL-encode Solr parameters, repeating the key of list values."""
+    pairs = []
+    for key, value in params.items():
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        for item in value:
+            if isinstance(item, unicode):
+                item = item.encode('utf-8')
+            pairs.append((key, item))
+    return urlencode(pairs)
+
+
+class PooledSolr(Solr):
+    """
+    A pysolr connection that sends searches through a SolrConnectionPool
+    instead of opening a new connection per request.
+
+    """
+    def __init__(self, url, pool, post_threshold=1024, **kwargs):
+        super(PooledSolr, self).__init__(url, **kwargs)
+        self.pool = pool
+        # Searches whose encoded parameters are longer than this are sent
+        # as form-encoded POSTs rather than GETs.
+        self.post_threshold = post_threshold
+        self._local = threading.local()
+
+    @property
+    def last_method(self):
+        """The HTTP method of this thread's most recent search."""
+        return getattr(self._local, 'method', None)
+
+    @last_method.setter
+    def last_method(self, method):
+        self._local.method = method
+
+    def _select(self, params):
+        # Specify json encoding of results, as pysolr does.
+        params['wt'] = 'json'
+        params_encoded = encode_params(params)
+        url = '%s/select/' % self.url.rstrip('/')
+
+        self.pool.count('requests')
+        if len(params_encoded) <= self.post_threshold:
+            self._local.method = 'GET'
+            response = self.pool.session.get('%s?%s' % (url, params_encoded),
+                                             timeout=self.timeout)
+        else:
+            self._local.method = 'POST'
+            headers = {'Content-type':
+                       'application/x-www-form-urlencoded; charset=utf-8'}
+            response = self.pool.session.post(url, data=params_encoded,
+                                              headers=headers,
+                                              timeout=self.timeout)
+
+        if response.status_code >= 300:
+            if response.status_code >= 500:
+                error_class = SolrServerError
+            else:
+                error_class = SolrError
+            raise error_class("[Reason: %s] %s" % (response.reason,
+                                                   response.text[:500]))
+        return response.text
@@ -1,7 +1,17 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib import quote_plus
+
 from django.conf import settings
+from django.db.models import get_model
 from django.utils import tree
+from django.utils.importlib import import_module
 
-from haystack.backends import log_query, EmptyResults, BaseEngine, SearchNode
+from haystack.backends import EmptyResults, BaseEngine, SearchNode
 from haystack.backends.solr_backend import SolrSearchBackend, SolrSearchQuery
 from haystack.constants import ID, DJANGO_CT, DJANGO_ID
 from haystack.models import SearchResult
@@ -9,6 +19,96 @@ from haystack.query import SearchQuerySet, SQ
 
 from pysolr import SolrError
 
+from saved_search.cache import LRUCache
+from saved_search.connection import (PooledSolr, SolrServerError, futures,
+                                     get_executor, get_pool)
+
+# Result caches and filter query registries, shared by every backend
+# instance of a connection alias.
+_result_caches = {}
+_filter_registries = {}
+
+# Faster drop-in JSON decoders, tried in order when JSON_DECODER is 'auto'.
+FAST_JSON_MODULES = ('orjson', 'ujson')
+
+
+def log_query(func):
+    """
+    Logs searches to the connection's query log when DEBUG is on, as
+    haystack's log_query does, adding the HTTP method each search was sent
+    with to its entry.
+
+    Searches answered from the result cache send no request, and are
+    logged without a method.
+
+    """
+    @wraps(func)
+    def wrapper(obj, query_string, *args, **kwargs):
+        if isinstance(obj.conn, PooledSolr):
+            # Forget this thread's previous search, which may be all that
+            # last_method holds if this one never reaches Solr.
+            obj.conn.last_method = None
+        start = time.time()
+
+        try:
+            return func(obj, query_string, *args, **kwargs)
+        finally:
+            stop = time.time()
+
+            if settings.DEBUG:
+                from haystack import connections
+                entry = {
+                    'query_string': query_string,
+                    'additional_args': args,
+                    'additional_kwargs': kwargs,
+                    'time': "%.3f" % (stop - start),
+                    'start': start,
+                    'stop': stop,
+                }
+                # last_method is per thread, so this is the method of this
+                # search even when other threads are searching too.
+                method = getattr(obj.conn, 'last_method', None)
+                if method:
+                    entry['method'] = method
+                connections[obj.connection_alias].queries.append(entry)
+    return wrapper
+
+
+class LoadsDecoder(object):
+    """Adapts a `loads` function to the json.JSONDecoder interface."""
+    def __init__(self, loads):
+        self.loads = loads
+
+    def decode(self, s):
+        return self.loads(s)
+
+
+def get_json_decoder(name='auto'):
+    """
+    Returns the decoder named by a backend's JSON_DECODER option: 'json'
+    for the standard library, 'auto' for the first importable module in
+    FAST_JSON_MODULES (falling back to the standard library), or the
+    dotted path of any module with a `loads` function, or of such a
+    function itself.
+
+    """
+    if name == 'json':
+        return json.JSONDecoder()
+
+    if name == 'auto':
+        for module_name in FAST_JSON_MODULES:
+            try:
+                return LoadsDecoder(import_module(module_name).loads)
+            except ImportError:
+                continue
+        return json.JSONDecoder()
+
+    try:
+        return LoadsDecoder(import_module(name).loads)
+    except ImportError:
+        module_name, attr = name.rsplit('.', 1)
+        return LoadsDecoder(getattr(import_module(module_name), attr))
+
 
 class GroupQuerySet(SearchQuerySet):
     def group_query(self, *args, **kwargs):
@@ -21,11 +121,241 @@ class GroupQuerySet(SearchQuerySet):
         clone.query.add_group_query(*args, **kwargs)
         return clone
 
+    def for_saved_searches(self, saved_searches):
+        """
+        Adds a group query per saved search, so that any number of saved
+        searches are evaluated by a single grouped query (split into as
+        few requests as the backend's size limit allows). Each result group
+        carries the saved search it was produced by under the
+        'saved_search' key, and its primary key under 'tag'.
+
+        Saved searches compiling to the same query are sent once, and the
+        group Solr returns for it is fanned back out to each of them; see
+        `group_query_stats`.
+
+        """
+        clone = self._clone()
+        for saved_search in saved_searches:
+            clone.query.add_saved_search(saved_search)
+        return clone
+
+    def canonical_groups(self):
+        """
+        Sends group queries in a canonical (sorted) order instead of the
+        order they were added in, so that querysets built up in different
+        orders produce identical Solr requests.
+
+        """
+        clone = self._clone()
+        clone.query.canonical_group_order = True
+        return clone
+
+    def only(self, *fields):
+        """
+        Limits the stored fields fetched for each grouped document to
+        `fields` (plus the identifiers needed to load the object).
+
+        """
+        clone = self._clone()
+        clone.query.set_result_fields(fields + (ID, DJANGO_CT, DJANGO_ID,
+                                                'score'))
+        return clone
+
+    def values(self, *fields):
+        """
+        Fetches only `fields`, and returns each group's documents as
+        dictionaries of those fields.
+
+        """
+        clone = self._clone()
+        clone.query.set_result_fields(fields, values='dict')
+        return clone
+
+    def values_list(self, *fields):
+        """
+        Fetches only `fields`, and returns each group's documents as tuples
+        of those fields, in the order given.
+
+        """
+        clone = self._clone()
+        clone.query.set_result_fields(fields, values='tuple')
+        return clone
+
+    def hoist_common_clauses(self):
+        """
+        Moves clauses AND-ed into every group query into a single filter
+        query, leaving only the distinguishing parts in each group query.
+        Solr then evaluates the shared clauses once, from its filterCache.
+
+        Only clauses joined by explicit ANDs are hoisted (see
+        `split_conjuncts`), as only those are required by every query.
+        Group hits are unchanged, but because the shared clauses become a
+        filter on the whole search, so are facet counts.
+
+        """
+        clone = self._clone()
+        clone.query.hoist_common = True
+        return clone
+
+    def aexecute(self):
+        """
+        Runs the query in the background on the thread pool of an
+        AsyncSolrGroupSearchBackend, so that one thread can fan out grouped
+        queries for many sites at once.
+
+        Returns a concurrent.futures.Future whose result is the list of
+        result groups. Under asyncio, await it through asyncio.wrap_future.
+
+        """
+        if not isinstance(self.query.backend, AsyncSolrGroupSearchBackend):
+            raise GroupQueryError("aexecute() requires a connection using "
+                                  "SolrGrpAsyncEngine.")
+
+        clone = self._clone()
+        return clone.query.backend.submit(clone.query.get_results)
+
+    def group_counts(self):
+        """
+        Returns the number of hits of each group, keyed by the group's tag
+        (or by the group query itself for untagged groups).
+
+        Unless the groups have already been fetched, this runs in count
+        mode: rows=0, only the id field and no facets, highlighting or
+        spelling, so no documents are transferred or processed.
+
+        """
+        group_queries = self.query.group_queries
+        counts = {}
+        for group, hits in self.query.get_group_hits().items():
+            for tag, saved_search in group_queries.members(group):
+                counts[tag or group] = hits
+        return counts
+
+    def group_query_stats(self):
+        """
+        Returns how many group queries were added, how many unique ones are
+        sent to Solr, and the ratio of duplicates saved.
+
+        """
+        group_queries = self.query.group_queries
+        added = group_queries.member_count()
+        unique = len(group_queries)
+        return {
+            'added': added,
+            'unique': unique,
+            'dedup_ratio': 1 - float(unique) / added if added else 0.0,
+        }
+
     def __len__(self):
-        if not self.query._results:
-            qc = self.query.get_count()
-            
-        return len(self.query._results)
+        """
+        Returns the total number of hits across all groups, which is what
+        Django's paginator expects. If the groups have not been fetched
+        yet, a count-only query is run rather than the full query.
+
+        The number of result groups needs no query at all; use
+        `self.query.get_group_count()`.
+
+        """
+        return self.query.get_count()
+
+
+class GroupQueries(object):
+    """
+    An insertion-ordered collection of unique group queries. Each maps to
+    the (tag, saved search) pairs it was added with, as identical group
+    queries added more than once are only sent to Solr once.
+
+    Copies are copy-on-write: `copy()` shares the underlying storage, and
+    whichever of the copies is written to first takes a private copy of it.
+    Cloning a query is therefore O(1), and group queries added to a clone
+    never leak into the query it was cloned from.
+
+    """
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._shared = False
+
+    def copy(self):
+        clone = self.__class__()
+        clone._entries = self._entries
+        clone._shared = self._shared = True
+        return clone
+
+    def add(self, qfrag, tag=None, saved_search=None):
+        members = self._entries.get(qfrag, ())
+        if (tag, saved_search) in members:
+            return
+
+        if self._shared:
+            self._entries = OrderedDict(self._entries)
+            self._shared = False
+        # Members are tuples, so entries shared with copies never change.
+        self._entries[qfrag] = members + ((tag, saved_search),)
+
+    def members(self, qfrag):
+        """Returns the (tag, saved search) pairs `qfrag` was added with."""
+        return self._entries.get(qfrag, ((None, None),))
+
+    def tag(self, qfrag):
+        """Returns the tag `qfrag` was first added with."""
+        return self.members(qfrag)[0][0]
+
+    def saved_search(self, qfrag):
+        """Returns the saved search `qfrag` was first compiled from."""
+        return self.members(qfrag)[0][1]
+
+    def member_count(self):
+        """Returns the number of group queries added, duplicates included."""
+        return sum(len(members) for members in self._entries.values())
+
+    def ordered(self, canonical=False):
+        """
+        Returns the group queries in insertion order, or sorted if
+        `canonical` is True.
+
+        """
+        if canonical:
+            return sorted(self._entries)
+        return list(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, qfrag):
+        return qfrag in self._entries
+
+
+def canonical_group_query(qfrag):
+    """
+    Normalizes whitespace and removes redundant outer parentheses, so that
+    equivalent compiled queries compare equal.
+
+    Only whitespace separating clauses is touched: whitespace in quoted
+    phrases and escaped whitespace are part of a term, and are kept as is.
+
+    """
+    qfrag = _collapse_whitespace(qfrag)
+    while _is_parenthesized(qfrag):
+        qfrag = _collapse_whitespace(qfrag[1:-1])
+    return qfrag
+
+
+def _collapse_whitespace(qfrag):
+    chars = []
+    space = False
+    for i, char, depth, quoted in _scan(qfrag):
+        if char.isspace() and not quoted:
+            # Leading and trailing whitespace is dropped.
+            space = bool(chars)
+            continue
+        if space:
+            chars.append(' ')
+            space = False
+        chars.append(char)
+    return ''.join(chars)
 
 
 class GroupQueryError(Exception):
@@ -36,6 +366,496 @@ class GroupQueryError(Exception):
         return repr(self.param)
     
     
+class GroupDocument(object):
+    """
+    A compact, read-only stand-in for SearchResult used for grouped
+    documents. It wraps the raw Solr document without copying or converting
+    its fields; any stored field can be read as an attribute or item, and
+    the database object is only loaded when `object` is accessed.
+
+    Like SearchResult, highlighted snippets of the document, if any were
+    requested, are available as `highlighted`.
+
+    """
+    __slots__ = ('app_label', 'model_name', 'pk', 'score', 'highlighted',
+                 '_doc', '_object')
+
+    def __init__(self, doc, highlighted=None):
+        try:
+            self.app_label, self.model_name = doc[DJANGO_CT].split('.')
+        except (KeyError, ValueError):
+            self.app_label = self.model_name = None
+        self.pk = doc.get(DJANGO_ID)
+        self.score = doc.get('score')
+        self.highlighted = highlighted
+        self._doc = doc
+        self._object = None
+
+    @property
+    def model(self):
+        if self.app_label is None:
+            return None
+        return get_model(self.app_label, self.model_name)
+
+    @property
+    def object(self):
+        if self._object is None and self.model is not None:
+            try:
+                self._object = self.model._default_manager.get(pk=self.pk)
+            except self.model.DoesNotExist:
+                pass
+        return self._object
+
+    def get_stored_fields(self):
+        return self._doc
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._doc[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return self._doc[name]
+
+    def __getstate__(self):
+        return self._doc, self.highlighted, self._object
+
+    def __setstate__(self, state):
+        doc, highlighted, obj = state
+        self.__init__(doc, highlighted)
+        self._object = obj
+
+    def __repr__(self):
+        return '<GroupDocument: %s.%s (pk=%r)>' % (self.app_label,
+                                                   self.model_name, self.pk)
+
+
+class FacetView(object):
+    """
+    A read-only view of one facet field's (value, count) pairs, over the
+    list or map Solr returned, without copying it.
+
+    `json_nl` is the json.nl format the response was requested with:
+    'flat' ([value, count, value, count, ...], Solr's default), 'arrarr'
+    ([[value, count], ...]) or 'map' ({value: count, ...}; only ordered
+    if the JSON decoder preserves key order).
+
+    """
+    __slots__ = ('_counts', '_json_nl')
+
+    def __init__(self, counts, json_nl='flat'):
+        self._counts = counts
+        self._json_nl = json_nl
+
+    def __len__(self):
+        if self._json_nl == 'flat':
+            return len(self._counts) // 2
+        return len(self._counts)
+
+    def __iter__(self):
+        counts = self._counts
+        if self._json_nl == 'flat':
+            for i in xrange(0, len(counts) - 1, 2):
+                yield counts[i], counts[i + 1]
+        elif self._json_nl == 'arrarr':
+            for value, count in counts:
+                yield value, count
+        else:
+            for item in counts.iteritems():
+                yield item
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if self._json_nl == 'flat':
+            return self._counts[2 * index], self._counts[2 * index + 1]
+        elif self._json_nl == 'arrarr':
+            return tuple(self._counts[index])
+        for i, item in enumerate(self):
+            if i == index:
+                return item
+        raise IndexError(index)
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def __getstate__(self):
+        return self._counts, self._json_nl
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __repr__(self):
+        return '<FacetView: %d values>' % len(self)
+
+
+class GroupedResponse(object):
+    """
+    The parts of a grouped Solr response shared by all of its groups. Facets
+    and the spelling suggestion are processed once, on first access, and
+    every group of the response returns the same objects.
+
+    """
+    def __init__(self, backend, raw_results):
+        self.qtime = getattr(raw_results, 'qtime', None)
+        self._backend = backend
+        self._raw_results = raw_results
+        self._processed = None
+
+    @property
+    def facets(self):
+        return self._process()['facets']
+
+    @property
+    def spelling_suggestion(self):
+        return self._process()['spelling_suggestion']
+
+    @property
+    def highlighting(self):
+        return self._process()['highlighting']
+
+    def _process(self):
+        if self._processed is None:
+            self._processed = self._backend._process_response(
+                self._raw_results)
+        return self._processed
+
+    def __getstate__(self):
+        # Process before pickling; the backend holds locks and connections.
+        state = dict(self.__dict__, _processed=self._process())
+        state['_backend'] = state['_raw_results'] = None
+        return state
+
+
+class SearchGroup(object):
+    """
+    A single result group. Its hit count is read straight from the raw
+    response; the group's documents are only processed the first time they
+    are accessed. Facets and the spelling suggestion come from the
+    GroupedResponse shared by every group of the same response.
+
+    Groups can also be read like the dictionaries `_process_results`
+    returns, e.g. group['hits'].
+
+    """
+    _keys = ('group', 'results', 'hits', 'facets', 'spelling_suggestion',
+             'tag', 'saved_search')
+
+    def __init__(self, backend, raw_results, response=None, **process_kwargs):
+        self.group = raw_results[0]
+        self.tag = None
+        self.saved_search = None
+        self.response = response
+        self._backend = backend
+        self._raw_results = raw_results
+        self._process_kwargs = process_kwargs
+        self._processed = None
+        # The group this one was copied from, whose documents it shares.
+        self._source = None
+
+    @property
+    def hits(self):
+        try:
+            return self._raw_results[1]['doclist']['numFound']
+        except (KeyError, IndexError, TypeError):
+            return 0
+
+    @property
+    def results(self):
+        return self._process()['results']
+
+    @property
+    def facets(self):
+        if self.response is None:
+            return {}
+        return self.response.facets
+
+    @property
+    def spelling_suggestion(self):
+        if self.response is None:
+            return None
+        return self.response.spelling_suggestion
+
+    def _process(self):
+        if self._source is not None:
+            return self._source._process()
+        if self._processed is None:
+            self._processed = self._backend._process_results(
+                self._raw_results, response=self.response,
+                **self._process_kwargs)
+        return self._processed
+
+    def copy(self):
+        """
+        Returns a copy of the group, to be tagged differently, which shares
+        its raw results, response and processed documents.
+
+        """
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone._source = self._source or self
+        return clone
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __getstate__(self):
+        # Process before pickling, so that groups can be cached; the
+        # backend holds locks and connections.
+        return dict(self.__dict__, _processed=self._process(),
+                    _backend=None, _source=None)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self._keys)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __repr__(self):
+        return '<SearchGroup: %r (%s hits)>' % (self.group, self.hits)
+
+
+def _freeze(value):
+    """Converts list-like parameter values to (hashable) tuples."""
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(value))
+    elif isinstance(value, (list, tuple)) or (
+            hasattr(value, '__iter__') and not isinstance(value, basestring)):
+        return tuple(value)
+    return value
+
+
+class FilterQueryRegistry(object):
+    """
+    Builds the `fq` parameters of searches so that Solr's filterCache is
+    hit as often as possible: filters are emitted in a canonical (sorted)
+    order, static filters are built once, and filters can be given
+    `cache` and `cost` local params.
+
+    `options` maps filter queries to the local params to send them with,
+    e.g. {'django_ct:(jobs.job)': {'cost': 50}, 'buid:1': {'cache': False}}.
+    It is read from a backend's FILTER_QUERIES option.
+
+    Usage is counted for the `usage_size` most recently sent filters only,
+    as narrow() values and hoisted clauses make the set of filters ever
+    sent unbounded.
+
+    """
+    def __init__(self, options=None, usage_size=1000):
+        self.usage = LRUCache(maxsize=usage_size)
+        self._prefixed = {}
+        self._models_fq = None
+        self._lock = threading.Lock()
+        for fq, local_params in (options or {}).items():
+            self.register(fq, **local_params)
+
+    def register(self, fq, cache=None, cost=None):
+        """Sends `fq` with the given `cache` and `cost` local params."""
+        local_params = []
+        if cache is not None:
+            local_params.append('cache=%s' % ('true' if cache else 'false'))
+        if cost is not None:
+            local_params.append('cost=%d' % cost)
+
+        if not local_params:
+            self._prefixed.pop(fq, None)
+        elif fq.startswith('{!'):
+            # Merge with the filter's own local params.
+            end = fq.index('}')
+            self._prefixed[fq] = '%s %s%s' % (fq[:end], ' '.join(local_params),
+                                              fq[end:])
+        else:
+            self._prefixed[fq] = '{!%s}%s' % (' '.join(local_params), fq)
+
+    def models_fq(self, build_models_list):
+        """
+        Returns the filter limiting results to registered models, building
+        it with `build_models_list` the first time only.
+
+        """
+        if self._models_fq is None:
+            models = build_models_list()
+            if models:
+                self._models_fq = '%s:(%s)' % (DJANGO_CT,
+                                               ' OR '.join(sorted(models)))
+            else:
+                self._models_fq = ''
+        return self._models_fq
+
+    def build(self, narrow_queries):
+        """Returns `narrow_queries` as a canonically ordered fq list."""
+        fqs = sorted(set(narrow_queries))
+        with self._lock:
+            for fq in fqs:
+                self.usage.set(fq, self.usage.get(fq, 0) + 1)
+        return [self._prefixed.get(fq, fq) for fq in fqs]
+
+    def stats(self):
+        """
+        Returns how many searches each recently used filter query was sent
+        with, and the filters sent with more than one (and so likely served
+        from Solr's filterCache).
+
+        """
+        with self._lock:
+            usage = dict(self.usage.items())
+        return {
+            'usage': usage,
+            'reused': sorted(fq for fq, count in usage.items() if count > 1),
+        }
+
+
+class SearchParams(object):
+    """
+    The immutable, hashable result of SolrGroupSearchBackend.build_params:
+    a query string, the Solr parameters sent with it, and the options used
+    to process the response. List values are held as tuples.
+
+    Parameters can be compared (`diff`), serialized for replay (`to_json`,
+    `from_json`) and used as a cache key (`cache_key`).
+
+    """
+    __slots__ = ('query_string', 'params', '_options', '_lookup')
+
+    def __init__(self, query_string, params, **options):
+        setattr_ = super(SearchParams, self).__setattr__
+        setattr_('query_string', query_string)
+        setattr_('params', tuple(sorted((key, _freeze(value))
+                                        for key, value in params.items())))
+        setattr_('_options', tuple(sorted((key, _freeze(value))
+                                          for key, value in options.items())))
+        setattr_('_lookup', dict(self.params))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SearchParams are immutable.")
+
+    def __getitem__(self, key):
+        return self._lookup[key]
+
+    def get(self, key, default=None):
+        return self._lookup.get(key, default)
+
+    @property
+    def options(self):
+        return dict(self._options)
+
+    def replace(self, params=None, **options):
+        """
+        Returns a copy with the given Solr parameters and options replaced.
+        A parameter set to None is removed.
+
+        """
+        new_params = dict(self._lookup)
+        for key, value in (params or {}).items():
+            if value is None:
+                new_params.pop(key, None)
+            else:
+                new_params[key] = value
+        return self.__class__(self.query_string, new_params,
+                              **dict(self._options, **options))
+
+    def as_kwargs(self):
+        """Returns the Solr parameters as keyword arguments for pysolr."""
+        return dict((key, list(value) if isinstance(value, tuple) else value)
+                    for key, value in self.params)
+
+    def diff(self, other):
+        """
+        Returns the Solr parameters that differ from those of `other`, as a
+        dictionary of (own value, other value) pairs. The query string is
+        included under 'q' and options under 'options.<name>' if they
+        differ, so parameters that are not equal always have a diff.
+
+        """
+        mine, theirs = dict(self._lookup), dict(other._lookup)
+        mine['q'], theirs['q'] = self.query_string, other.query_string
+        for params, options in ((mine, self._options),
+                                (theirs, other._options)):
+            params.update(('options.%s' % key, value)
+                          for key, value in options)
+        return dict((key, (mine.get(key), theirs.get(key)))
+                    for key in set(mine) | set(theirs)
+                    if mine.get(key) != theirs.get(key))
+
+    def cache_key(self):
+        """
+        Hashes the query string and Solr parameters. List values are sorted
+        first, so the order group queries, filters or facets were added in
+        doesn't matter.
+
+        """
+        params = [self.query_string]
+        for key, value in self.params:
+            if isinstance(value, tuple):
+                value = sorted(value)
+            params.append((key, value))
+
+        return hashlib.md5(json.dumps(params, default=unicode)).hexdigest()
+
+    def to_json(self):
+        """
+        Serializes the query string, Solr parameters and options, with
+        `result_class` as its dotted path.
+
+        """
+        options = dict(self._options)
+        result_class = options.get('result_class')
+        if result_class is not None:
+            options['result_class'] = '%s.%s' % (result_class.__module__,
+                                                 result_class.__name__)
+        return json.dumps({'q': self.query_string, 'params': self.as_kwargs(),
+                           'options': options}, sort_keys=True)
+
+    @classmethod
+    def from_json(cls, data):
+        data = json.loads(data)
+        options = dict((str(key), value)
+                       for key, value in data['options'].items())
+        if options.get('result_class') is not None:
+            module, name = options['result_class'].rsplit('.', 1)
+            options['result_class'] = getattr(import_module(module), name)
+        return cls(data['q'], data['params'], **options)
+
+    def __eq__(self, other):
+        return (isinstance(other, SearchParams) and
+                (self.query_string, self.params, self._options) ==
+                (other.query_string, other.params, other._options))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.query_string, self.params, self._options))
+
+    def __repr__(self):
+        return '<SearchParams: %r %r>' % (self.query_string, self.params)
+
+
 class SolrGroupSearchBackend(SolrSearchBackend):
     """
     Solr's result grouping feature is very useful but provides results of
@@ -47,22 +867,92 @@ class SolrGroupSearchBackend(SolrSearchBackend):
     http://wiki.apache.org/solr/FieldCollapsing
     
     """
+    def __init__(self, connection_alias, **connection_options):
+        super(SolrGroupSearchBackend, self).__init__(connection_alias,
+                                                     **connection_options)
+        # Upper bound, in URL-encoded characters, on the group.query
+        # parameters sent in a single request. Long requests are POSTed, so
+        # the default only keeps well within Solr's default 2MB limit on
+        # form data.
+        self.group_query_max_length = connection_options.get(
+            'GROUP_QUERY_MAX_LENGTH', 1000000)
+
+        # The json.nl format facet counts are requested in; see FacetView.
+        self.facet_json_nl = connection_options.get('FACET_JSON_NL', 'flat')
+
+        # Searches go through a pool of keep-alive connections shared by the
+        # connection alias, when requests is installed.
+        self.pool = get_pool(connection_alias, **connection_options)
+        if self.pool is not None:
+            self.conn = PooledSolr(
+                connection_options['URL'], self.pool, timeout=self.timeout,
+                post_threshold=connection_options.get('POST_THRESHOLD', 1024))
+        self.retries = connection_options.get('RETRIES', 2)
+        self.retry_backoff = connection_options.get('RETRY_BACKOFF', 0.1)
+
+        # Queries split into several chunks run them concurrently on a
+        # thread pool of PARALLEL_WORKERS threads, if set, within an overall
+        # deadline of PARALLEL_TIMEOUT seconds.
+        self.parallel_workers = connection_options.get('PARALLEL_WORKERS', 0)
+        self.parallel_timeout = connection_options.get('PARALLEL_TIMEOUT',
+                                                       self.timeout)
+        if self.parallel_workers:
+            self.chunk_executor = get_executor(
+                '%s:chunks' % connection_alias, self.parallel_workers)
+        else:
+            self.chunk_executor = None
+
+        # pysolr decodes responses with `conn.decoder`; grouped responses
+        # are large enough for a faster decoder to matter.
+        self.conn.decoder = get_json_decoder(
+            connection_options.get('JSON_DECODER', 'auto'))
+
+        self.filter_queries = _filter_registries.setdefault(
+            connection_alias, FilterQueryRegistry(
+                connection_options.get('FILTER_QUERIES'),
+                usage_size=connection_options.get('FILTER_QUERY_STATS_SIZE',
+                                                  1000)))
+
+        # An optional cache of raw Solr responses, keyed by the final
+        # search parameters. Disabled unless RESULT_CACHE_SIZE is set.
+        cache_size = connection_options.get('RESULT_CACHE_SIZE', 0)
+        if cache_size:
+            self.result_cache = _result_caches.setdefault(
+                connection_alias, LRUCache(
+                    maxsize=cache_size,
+                    timeout=connection_options.get('RESULT_CACHE_TIMEOUT',
+                                                   60)))
+        else:
+            self.result_cache = None
+
     @log_query
-    def search(self, query_string, sort_by=None, start_offset=0, end_offset=None,
-               fields='', highlight=False, facets=None, date_facets=None,
-               query_facets=None, narrow_queries=None, spelling_query=None,
-               limit_to_registered_models=None, result_class=None, group=True,
-               group_ngroups=True, group_query=[], group_format="simple",
-               **kwargs):
+    def search(self, query_string, **kwargs):
+        """
+        Builds the search parameters and executes them. Accepts the same
+        arguments as `build_params`.
+
+        """
+        params = self.build_params(query_string, **kwargs)
+
+        if len(query_string) == 0:
+            return []
+
+        return self.execute(params)
+
+    def build_params(self, query_string, sort_by=None, start_offset=0,
+                     end_offset=None, fields='', highlight=False, facets=None,
+                     date_facets=None, query_facets=None, narrow_queries=None,
+                     spelling_query=None, limit_to_registered_models=None,
+                     result_class=None, group=True, group_ngroups=True,
+                     group_query=[], group_format="simple", count_only=False,
+                     values=None, **kwargs):
+        """
+        Builds the Solr parameters of a grouped search, without running it.
+        Returns an immutable, hashable SearchParams.
 
+        """
         if not group_query:
             raise GroupQueryError("You must specify at least one group query.")
-                
-        if len(query_string) == 0:
-            return {
-                'results': [],
-                'hits': 0,
-            }
 
         kwargs = {
             'fl': '* score',
@@ -85,11 +975,25 @@ class SolrGroupSearchBackend(SolrSearchBackend):
         elif end_offset is not None:
             kwargs['rows'] = end_offset - start_offset
 
+        if count_only:
+            # Only each group's numFound is wanted; skip the documents and
+            # everything computed from them.
+            kwargs['fl'] = ID
+            kwargs['rows'] = 0
+            kwargs.pop('start', None)
+            highlight = False
+            facets = date_facets = query_facets = None
+
+        if values:
+            # Values are read straight from the stored fields, so there is
+            # nothing to attach highlighting to.
+            highlight = False
+
         if highlight is True:
             kwargs['hl'] = 'true'
             kwargs['hl.fragsize'] = '200'
 
-        if self.include_spelling is True:
+        if self.include_spelling is True and not count_only:
             kwargs['spellcheck'] = 'true'
             kwargs['spellcheck.collate'] = 'true'
             kwargs['spellcheck.count'] = 1
@@ -106,6 +1010,9 @@ class SolrGroupSearchBackend(SolrSearchBackend):
                     kwargs['f.%s.facet.%s' % (facet_field, key)] = self.conn._from_python(value)
 
 
+        if self.facet_json_nl != 'flat':
+            kwargs['json.nl'] = self.facet_json_nl
+
         kwargs['group'] = self.conn._from_python(kwargs['group'])
         kwargs['group.ngroups'] = self.conn._from_python(kwargs['group.ngroups'])
 
@@ -140,20 +1047,36 @@ class SolrGroupSearchBackend(SolrSearchBackend):
         if limit_to_registered_models:
             # Using narrow queries, limit the results to only models handled
             # with the current routers.
-            if narrow_queries is None:
-                narrow_queries = set()
+            narrow_queries = set(narrow_queries or [])
 
-            registered_models = self.build_models_list()
+            models_fq = self.filter_queries.models_fq(self.build_models_list)
 
-            if len(registered_models) > 0:
-                narrow_queries.add('%s:(%s)' % (DJANGO_CT,
-                                                ' OR '.join(registered_models)))
+            if models_fq:
+                narrow_queries.add(models_fq)
 
         if narrow_queries is not None:
-            kwargs['fq'] = list(narrow_queries)
+            kwargs['fq'] = self.filter_queries.build(narrow_queries)
+
+        return SearchParams(query_string, kwargs, highlight=highlight,
+                            result_class=result_class, values=values,
+                            fields=tuple(fields.split()))
+
+    def execute(self, params):
+        """
+        Sends a SearchParams to Solr. Returns the list of result groups, in
+        the order their group queries were given.
+
+        """
+        query_string = params.query_string
+        kwargs = params.as_kwargs()
 
         try:
-            raw_results = self.conn.search(query_string, **kwargs)
+            if self.result_cache is None:
+                raw_results = self._search_with_retry(query_string, kwargs)
+            else:
+                raw_results = self.result_cache.get_or_set(
+                    params.cache_key(),
+                    lambda: self._search_with_retry(query_string, kwargs))
         except (IOError, SolrError) as e:
             if not self.silently_fail:
                 raise
@@ -163,20 +1086,72 @@ class SolrGroupSearchBackend(SolrSearchBackend):
             raw_results = [EmptyResults()]
 
         if hasattr(raw_results, 'grouped'):
-            return [self._process_results(res, highlight=highlight,
-                                          result_class=result_class)
-                    for res in raw_results.grouped.iteritems()]
+            # Return groups in the order they were requested, looking each
+            # one up by its group query rather than relying on the order
+            # of the response.
+            grouped = raw_results.grouped
+            response = GroupedResponse(self, raw_results)
+            return [SearchGroup(self, (qfrag, grouped[qfrag]), response,
+                                **params.options)
+                    for qfrag in params['group.query'] if qfrag in grouped]
         else:
             return []
 
-    def _process_results(self, raw_results, highlight=False, result_class=None):
-        from haystack import connections
+    def _search_with_retry(self, query_string, kwargs):
+        """
+        Runs the search, retrying up to RETRIES times with exponential
+        backoff (starting at RETRY_BACKOFF seconds) on connection errors
+        and 5xx responses. Other Solr errors, such as a 400 for a malformed
+        query, would fail again and are raised straight away.
+
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return self.conn.search(query_string, **kwargs)
+            except (IOError, SolrError) as e:
+                if (attempt == self.retries or
+                        not isinstance(e, (IOError, SolrServerError))):
+                    if self.pool is not None:
+                        self.pool.count('failures')
+                    raise
+
+                if self.pool is not None:
+                    self.pool.count('retries')
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def pool_stats(self):
+        """
+        Returns the connection pool's counters, or None if searches are not
+        pooled.
+
+        """
+        if self.pool is None:
+            return None
+        return self.pool.stats()
+
+    def filter_query_stats(self):
+        """Returns the usage counts of filter queries; see FilterQueryRegistry."""
+        return self.filter_queries.stats()
+
+    def result_cache_stats(self):
+        """
+        Returns the result cache's hit and miss counters and size, or None
+        if the cache is disabled.
 
+        """
+        if self.result_cache is None:
+            return None
+        return self.result_cache.stats()
+
+    def _process_results(self, raw_results, highlight=False, result_class=None,
+                         values=None, fields=None, response=None):
         results = []
         try:
             hits = raw_results[1]['doclist']['numFound']
+            docs = raw_results[1]['doclist'].get('docs', [])
         except (KeyError, IndexError):
             hits = 0
+            docs = []
 
         try:
             group = raw_results[0]
@@ -185,39 +1160,239 @@ class SolrGroupSearchBackend(SolrSearchBackend):
 
         facets = {}
         spelling_suggestion = None
+        highlighting = {}
+        if highlight and response is not None:
+            # Solr returns highlighting for the whole response, keyed by
+            # document id, rather than within each group.
+            highlighting = response.highlighting
+
+        # Unless a custom result class is asked for, documents are wrapped
+        # rather than converted into full SearchResult objects.
+        if values == 'dict':
+            results = [dict((field, doc.get(field)) for field in fields)
+                       for doc in docs]
+        elif values == 'tuple':
+            results = [tuple(doc.get(field) for field in fields)
+                       for doc in docs]
+        elif result_class in (None, SearchResult):
+            results = [GroupDocument(doc, highlighting.get(doc.get(ID)))
+                       for doc in docs]
+        else:
+            for doc in docs:
+                app_label, model_name = doc[DJANGO_CT].split('.')
+                additional_fields = dict(
+                    (str(key), self.conn._to_python(value))
+                    for key, value in doc.items()
+                    if key not in (DJANGO_CT, DJANGO_ID, 'score'))
+                if doc.get(ID) in highlighting:
+                    additional_fields['highlighted'] = highlighting[doc[ID]]
+                results.append(result_class(app_label, model_name,
+                                            doc[DJANGO_ID], doc.get('score'),
+                                            **additional_fields))
+
+        if response is not None:
+            facets = response.facets
+            spelling_suggestion = response.spelling_suggestion
 
-        if result_class is None:
-            result_class = SearchResult
+        return {
+            'group': group,
+            'results': results,
+            'hits': hits,
+            'facets': facets,
+            'spelling_suggestion': spelling_suggestion
+        }
+
+    def _process_response(self, raw_results):
+        """
+        Processes the parts of a grouped response shared by all of its
+        groups: facets, the spelling suggestion and highlighting.
+
+        """
+        facets = {}
+        spelling_suggestion = None
 
         if hasattr(raw_results, 'facets'):
             facets = {
-                'fields': raw_results.facets.get('facet_fields', {}),
+                'fields': {},
                 'dates': raw_results.facets.get('facet_dates', {}),
                 'queries': raw_results.facets.get('facet_queries', {}),
             }
 
-            for key in ['fields']:
-                for facet_field in facets[key]:
-                    # Convert to a two-tuple, as Solr's json format returns a list of
-                    # pairs.
-                    facets[key][facet_field] = zip(facets[key][facet_field][::2],
-                                                   facets[key][facet_field][1::2])
+            for facet_field, counts in raw_results.facets.get(
+                    'facet_fields', {}).items():
+                # Iterate the (value, count) pairs in place rather than
+                # zipping copies of the list Solr returned.
+                facets['fields'][facet_field] = FacetView(counts,
+                                                          self.facet_json_nl)
 
         if self.include_spelling is True:
             if hasattr(raw_results, 'spellcheck'):
-                if len(raw_results.spellcheck.get('suggestions', [])):
-                    # For some reason, it's an array of pairs. Pull off the
-                    # collated result from the end.
-                    spelling_suggestion = raw_results.spellcheck.get('suggestions')[-1]
+                suggestions = raw_results.spellcheck.get('suggestions', [])
+                if len(suggestions):
+                    # The collated result comes last. json.nl applies to
+                    # suggestions too, so pull it out of whichever format.
+                    if self.facet_json_nl == 'map':
+                        spelling_suggestion = suggestions.get('collation')
+                    elif self.facet_json_nl == 'arrarr':
+                        spelling_suggestion = suggestions[-1][1]
+                    else:
+                        spelling_suggestion = suggestions[-1]
 
         return {
-            'group': group,
-            'results': results,
-            'hits': hits,
             'facets': facets,
-            'spelling_suggestion': spelling_suggestion
+            'spelling_suggestion': spelling_suggestion,
+            'highlighting': getattr(raw_results, 'highlighting', {}),
         }
 
+
+def split_conjuncts(qfrag):
+    """
+    Splits a group query into its local params prefix (e.g. '{!tag="1"}')
+    and its top-level clauses, if it is a plain conjunction: clauses joined
+    by explicit ANDs. Outer parentheses are removed.
+
+    Any other query is returned as a single clause, as its top-level
+    clauses are not all required: clauses joined by whitespace alone
+    (Lucene's default operator, OR unless configured otherwise), any other
+    operator (OR, NOT, &&, ||, and +, - or ! prefixes), and queries with
+    local params other than a tag for the standard lucene parser.
+
+    """
+    prefix = ''
+    qfrag = qfrag.strip()
+    if qfrag.startswith('{!'):
+        end = qfrag.find('}')
+        if not _is_lucene_local_params(qfrag[:end + 1]):
+            return prefix, [qfrag]
+        prefix, qfrag = qfrag[:end + 1], qfrag[end + 1:].strip()
+
+    while _is_parenthesized(qfrag):
+        qfrag = qfrag[1:-1].strip()
+
+    # Split into top-level tokens at whitespace outside of brackets,
+    # quoted phrases and escapes.
+    tokens, start = [], None
+    for i, char, depth, quoted in _scan(qfrag):
+        if quoted or depth:
+            if start is None:
+                start = i
+        elif char.isspace():
+            if start is not None:
+                tokens.append(qfrag[start:i])
+                start = None
+        elif qfrag.startswith('&&', i) or qfrag.startswith('||', i):
+            return prefix, [qfrag]
+        elif start is None:
+            if char in '+-!':
+                return prefix, [qfrag]
+            start = i
+    if start is not None:
+        tokens.append(qfrag[start:])
+
+    clauses, operators = tokens[::2], tokens[1::2]
+    if (any(operator != 'AND' for operator in operators) or
+            any(clause in ('AND', 'OR', 'NOT') for clause in clauses) or
+            len(tokens) % 2 == 0):
+        return prefix, [qfrag]
+    return prefix, clauses
+
+
+def _is_lucene_local_params(prefix):
+    """
+    Whether a local params prefix only tags a query for the standard lucene
+    parser, e.g. '{!tag="1"}' or '{!lucene tag=1}'. Other params change how
+    the clauses are parsed ('{!df=title}', '{!q.op=AND}'), or which parser
+    does it ('{!dismax qf=title}'), so clauses can't be moved out of them.
+
+    """
+    for i, param in enumerate(prefix[2:-1].split()):
+        key, sep, value = param.partition('=')
+        if not sep:
+            # A leading bare word is shorthand for type=.
+            if i == 0 and key == 'lucene':
+                continue
+            return False
+        elif key == 'type':
+            if value.strip('\'"') != 'lucene':
+                return False
+        elif key != 'tag':
+            return False
+    return True
+
+
+def _scan(qfrag):
+    """
+    Yields (index, char, depth, quoted) for each character of a query.
+    `depth` is the nesting of brackets after the character, and `quoted`
+    is True for characters that are part of a quoted phrase or escaped,
+    and so have no syntactic meaning.
+
+    """
+    depth, in_quotes, escaped = 0, False, False
+    for i, char in enumerate(qfrag):
+        if escaped:
+            escaped = False
+            yield i, char, depth, True
+        elif char == '\\':
+            escaped = True
+            yield i, char, depth, True
+        elif char == '"':
+            in_quotes = not in_quotes
+            yield i, char, depth, True
+        elif in_quotes:
+            yield i, char, depth, True
+        else:
+            if char in '([{':
+                depth += 1
+            elif char in ')]}':
+                depth -= 1
+            yield i, char, depth, False
+
+
+def _is_parenthesized(qfrag):
+    """Whether `qfrag` is entirely wrapped in one pair of parentheses."""
+    if not (qfrag.startswith('(') and qfrag.endswith(')')):
+        return False
+
+    last = len(qfrag) - 1
+    for i, char, depth, quoted in _scan(qfrag):
+        if depth <= 0 and i < last:
+            return False
+    return True
+
+
+def hoist_common_clauses(group_queries):
+    """
+    Finds the top-level AND-ed clauses shared by every group query of a
+    batch. Returns those clauses, and a dictionary mapping each group query
+    to the group query left once they are removed ('*:*' if nothing is
+    left). Returns no clauses and an empty dictionary if there is nothing
+    to hoist.
+
+    """
+    if len(group_queries) < 2:
+        return [], {}
+
+    split = [(qfrag,) + split_conjuncts(qfrag) for qfrag in group_queries]
+    common = set(split[0][2])
+    for qfrag, prefix, clauses in split[1:]:
+        common.intersection_update(clauses)
+    if not common:
+        return [], {}
+
+    reduced = {}
+    for qfrag, prefix, clauses in split:
+        rest = ' AND '.join(c for c in clauses if c not in common) or '*:*'
+        reduced[qfrag] = '%s %s' % (prefix, rest) if prefix else rest
+
+    # Distinct group queries must stay distinct for their results to be
+    # told apart.
+    if len(set(reduced.values())) != len(reduced):
+        return [], {}
+
+    return sorted(common), reduced
+
+
 class SolrGroupSearchQuery(SolrSearchQuery):
     def __init__(self, **kwargs):
         super(SolrGroupSearchQuery, self).__init__(**kwargs)
@@ -225,7 +1400,22 @@ class SolrGroupSearchQuery(SolrSearchQuery):
         self.gquery_filter = SearchNode()
         self.group_format = "simple"
         self.group_ngroups = True
-        self.group_queries = set()
+        self.group_queries = GroupQueries()
+        self.canonical_group_order = False
+        self.result_fields = ()
+        self.result_values = None
+        self.hoist_common = False
+        self.hoisted_filters = []
+        self._group_hits = None
+
+    def set_result_fields(self, fields, values=None):
+        """
+        Sets the stored fields fetched for grouped documents, and whether
+        documents are returned as dicts or tuples of them (`values`).
+
+        """
+        self.result_fields = tuple(fields)
+        self.result_values = values
 
     def add_group_query(self, query_filter, use_or=False, is_master=True,
                         tag=None):
@@ -267,26 +1457,134 @@ class SolrGroupSearchQuery(SolrSearchQuery):
             # empty SearchNode.
             qfrag = self.gquery_filter.as_query_string(self.build_query_fragment)
 
-            # If specified, add a local param to identify individual group
-            # query statements.
-            if tag:
-                qfrag = '{!tag="%s"} ' % str(tag) + qfrag
-            
-            if qfrag:
-                self.group_queries.add(qfrag)
-
+            self.add_raw_group_query(qfrag, tag=tag)
             self.gquery_filter = SearchNode()
-            
+
+    def add_raw_group_query(self, qfrag, tag=None, saved_search=None):
+        """
+        Adds an already built query fragment as a group query. Returns the
+        group query as it will be sent to, and keyed in the response by,
+        Solr.
+
+        """
+        if not qfrag:
+            return None
+
+        # If specified, add a local param to identify individual group
+        # query statements.
+        if tag:
+            qfrag = '{!tag="%s"} ' % str(tag) + qfrag
+            tag = str(tag)
+
+        self.group_queries.add(qfrag, tag, saved_search)
+        return qfrag
+
+    def add_saved_search(self, saved_search):
+        """
+        Adds the compiled query of a saved search as a group query, tagged
+        with the saved search's primary key.
+
+        The tag is kept alongside the group query rather than sent as a
+        local param, so that saved searches compiling to the same query
+        share a single group query.
+
+        """
+        qfrag = saved_search.get_compiled_qs()
+        if qfrag:
+            self.group_queries.add(canonical_group_query(qfrag),
+                                   str(saved_search.pk), saved_search)
+
+    def _chunk_group_queries(self, group_queries):
+        """
+        Splits `group_queries` into lists whose URL-encoded size stays
+        within the backend's GROUP_QUERY_MAX_LENGTH. A single group query
+        larger than the limit gets a chunk of its own.
+
+        """
+        max_length = self.backend.group_query_max_length
+        chunks = []
+        chunk, chunk_length = [], 0
+
+        for qfrag in group_queries:
+            length = len('&group.query=') + len(quote_plus(
+                qfrag.encode('utf-8')))
+            if chunk and chunk_length + length > max_length:
+                chunks.append(chunk)
+                chunk, chunk_length = [], 0
+            chunk.append(qfrag)
+            chunk_length += length
+
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
     def run(self, spelling_query=None, **kwargs):
         """Builds & executes the query. Returns a list of result groupings."""
         final_query = self.build_query()
 
+        if self.highlight:
+            kwargs['highlight'] = self.highlight
+
+        if spelling_query:
+            kwargs['spelling_query'] = spelling_query
+
+        results = self._search_groups(final_query, **self._search_kwargs(
+            **kwargs))
+
+        self._results = results
+        self._hit_count = sum([r.hits for r in self._results])
+        self._cache_group_hits(results)
+
+    def run_count(self):
+        """
+        Runs the query in count mode: no documents, highlighting or
+        spelling suggestions are requested, only each group's numFound.
+
+        """
+        final_query = self.build_query()
+        results = self._search_groups(final_query, **self._search_kwargs(
+            count_only=True))
+
+        self._hit_count = sum([r.hits for r in results])
+        self._cache_group_hits(results)
+
+    def get_count(self):
+        """Returns the total number of hits across all groups."""
+        if self._hit_count is None:
+            self.run_count()
+
+        return self._hit_count
+
+    def get_group_count(self):
+        """
+        Returns the number of result groups. Solr returns exactly one group
+        per group query, fanned back out to each saved search sharing it,
+        so this is known without running the query.
+
+        """
+        return self.group_queries.member_count()
+
+    def get_group_hits(self):
+        """Returns a dictionary of numFound, keyed by group query."""
+        if self._group_hits is None:
+            self.run_count()
+
+        return self._group_hits
+
+    def _cache_group_hits(self, results):
+        self._group_hits = dict((r.group, r.hits) for r in results)
+
+    def _search_kwargs(self, **kwargs):
+        """Builds the keyword arguments passed to the backend's search."""
         kwargs['start_offset'] = self.start_offset
         kwargs['result_class'] = self.result_class
-        kwargs['group_query'] = [i for i in self.group_queries]
         kwargs['group_format'] = self.group_format
         kwargs['group_ngroups'] = self.group_ngroups
 
+        if self.result_fields:
+            kwargs['fields'] = ' '.join(self.result_fields)
+            kwargs['values'] = self.result_values
+
         if self.order_by:
             order_by_list = []
 
@@ -307,25 +1605,144 @@ class SolrGroupSearchQuery(SolrSearchQuery):
         if self.end_offset is not None:
             kwargs['end_offset'] = self.end_offset
 
-        if self.highlight:
-            kwargs['highlight'] = self.highlight
+        return kwargs
 
-        if spelling_query:
-            kwargs['spelling_query'] = spelling_query
+    def _search_groups(self, final_query, **kwargs):
+        """
+        Runs the group queries against the backend, one request per chunk,
+        and tags each result group with its tag and saved search.
+
+        """
+        if not self.group_queries:
+            raise GroupQueryError("You must specify at least one group query.")
+
+        group_queries = self.group_queries.ordered(self.canonical_group_order)
+
+        self.hoisted_filters, reduced = [], {}
+        if self.hoist_common:
+            self.hoisted_filters, reduced = hoist_common_clauses(group_queries)
+        if reduced:
+            group_queries = [reduced[qfrag] for qfrag in group_queries]
+            kwargs['narrow_queries'] = set(self.narrow_queries).union(
+                self.hoisted_filters)
 
-        self._results = self.backend.search(final_query, **kwargs)
-        self._hit_count = sum([r['hits'] for r in self._results])
+        chunks = self._chunk_group_queries(group_queries)
+
+        if len(chunks) > 1 and self.backend.parallel_workers:
+            results = self._search_chunks_parallel(final_query, chunks, kwargs)
+        else:
+            results = []
+            for chunk in chunks:
+                kwargs['group_query'] = chunk
+                results.extend(self.backend.search(final_query, **kwargs))
+
+        if reduced:
+            original = dict((v, k) for k, v in reduced.items())
+            for result in results:
+                result.group = original[result.group]
+
+        # Fan each group out to every tag and saved search that shares its
+        # group query.
+        fanned = []
+        for result in results:
+            members = self.group_queries.members(result.group)
+            for i, (tag, saved_search) in enumerate(members):
+                group = result.copy() if i else result
+                group.tag = tag
+                group.saved_search = saved_search
+                fanned.append(group)
+
+        return fanned
+
+    def _search_chunks_parallel(self, final_query, chunks, kwargs):
+        """
+        Runs each chunk of group queries as its own request on the
+        backend's chunk thread pool, waiting at most PARALLEL_TIMEOUT
+        seconds overall. Chunks still queued at the deadline are cancelled,
+        and results of chunks still running are discarded.
+
+        Results are returned in chunk order. If the deadline passes, the
+        results of the chunks that finished are returned when the backend
+        fails silently; otherwise GroupQueryError is raised.
+
+        """
+        executor = self.backend.chunk_executor
+        pending = [executor.submit(self.backend.search, final_query,
+                                   **dict(kwargs, group_query=chunk))
+                   for chunk in chunks]
+        done, not_done = futures.wait(pending,
+                                      timeout=self.backend.parallel_timeout)
+
+        for future in not_done:
+            future.cancel()
+
+        if not_done:
+            message = ("%d of %d group query chunks did not finish within "
+                       "%s seconds." % (len(not_done), len(chunks),
+                                        self.backend.parallel_timeout))
+            if not self.backend.silently_fail:
+                raise GroupQueryError(message)
+            self.backend.log.error(message)
+
+        results = []
+        for future in pending:
+            if future in done:
+                results.extend(future.result())
+        return results
 
     def has_run(self):
         """Indicates if any query has been run."""
         return None not in (self._results, self._hit_count)
 
+    def _reset(self):
+        super(SolrGroupSearchQuery, self)._reset()
+        self._group_hits = None
+
     def _clone(self, **kwargs):
         clone = super(SolrGroupSearchQuery, self)._clone(**kwargs)
-        clone.group_queries = self.group_queries
+        clone.group_queries = self.group_queries.copy()
+        clone.group = self.group
+        clone.group_format = self.group_format
+        clone.group_ngroups = self.group_ngroups
+        clone.canonical_group_order = self.canonical_group_order
+        clone.result_fields = self.result_fields
+        clone.result_values = self.result_values
+        clone.hoist_common = self.hoist_common
         return clone
         
 
+class AsyncSolrGroupSearchBackend(SolrGroupSearchBackend):
+    """
+    A SolrGroupSearchBackend whose searches can also be run in the
+    background, on a thread pool of ASYNC_WORKERS threads (10 by default)
+    shared by the connection alias. Parameters and results are built and
+    processed exactly as they are by `search`.
+
+    """
+    def __init__(self, connection_alias, **connection_options):
+        super(AsyncSolrGroupSearchBackend, self).__init__(connection_alias,
+                                                          **connection_options)
+        self.executor = get_executor(
+            connection_alias, connection_options.get('ASYNC_WORKERS', 10))
+
+    def submit(self, func, *args, **kwargs):
+        """Runs `func` on the thread pool, returning a Future."""
+        return self.executor.submit(func, *args, **kwargs)
+
+    def search_async(self, query_string, **kwargs):
+        """
+        Starts `search` in the background. Returns a Future whose result
+        is the list of result groups.
+
+        """
+        return self.submit(self.search, query_string, **kwargs)
+
+
 class SolrGrpEngine(BaseEngine):
     backend = SolrGroupSearchBackend
     query = SolrGroupSearchQuery
+
+
+class SolrGrpAsyncEngine(BaseEngine):
+    backend = AsyncSolrGroupSearchBackend
+    query = SolrGroupSearchQuery
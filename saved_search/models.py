@@ -1,8 +1,41 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 
+from saved_search.cache import LRUCache
+
 SOLR_ESCAPE_CHARS = ['+', '-', '&&', '||', '!', '(', ')', '{', '}', '[', ']',
                      '^', '~', '"', '*', '?']
 
+# (token, replacement) pairs, built once rather than on every escape.
+SOLR_ESCAPE_TABLE = [(token, '\\' + token) for token in SOLR_ESCAPE_CHARS]
+
+QS_CACHE_SIZE = getattr(settings, 'SAVED_SEARCH_QS_CACHE_SIZE', 10000)
+QS_CACHE_TIMEOUT = getattr(settings, 'SAVED_SEARCH_QS_CACHE_TIMEOUT', 86400)
+
+compiled_qs_cache = LRUCache(maxsize=QS_CACHE_SIZE)
+
+
+def solr_escape(value):
+    """
+    Backslash-escape every token in SOLR_ESCAPE_CHARS found in `value`.
+
+    `str.replace` scans in C without a per-match callback, so a chain of
+    replaces over the precomputed table outruns a single regex or
+    `translate` pass even on 7000 character querystrings. None of the
+    single character tokens is `&` or `|`, so the order of the table
+    cannot double-escape anything.
+
+    """
+    if not value:
+        return value
+
+    for token, escaped in SOLR_ESCAPE_TABLE:
+        value = value.replace(token, escaped)
+    return value
+
 
 class BaseSavedSearch(models.Model):
     name = models.CharField(max_length=100,
@@ -28,16 +61,83 @@ class BaseSavedSearch(models.Model):
     #make specific text fields sortable as boolean objects in the admin panel
     querystring.char_as_boolean_filter = True
     blurb.char_as_boolean_filter = True
+
+    # Attributes `_full_qs` reads, whose values identify a revision of the
+    # compiled query string. Concrete models whose query depends on
+    # anything else must extend this, or override `_qs_source_values`.
+    # Attributes a model lacks simply contribute an empty value.
+    query_source_fields = ('title', 'querystring', 'city', 'state', 'country')
     
     def __unicode__(self):
         return '%s' % self.name
 
+    def save(self, *args, **kwargs):
+        super(BaseSavedSearch, self).save(*args, **kwargs)
+        self._invalidate_compiled_qs()
+
+    def delete(self, *args, **kwargs):
+        self._invalidate_compiled_qs()
+        super(BaseSavedSearch, self).delete(*args, **kwargs)
+
+    def get_compiled_qs(self):
+        """
+        Return the output of `_full_qs`, building it at most once per
+        revision of the source fields.
+
+        Compiled strings are held in an in-process LRU backed by Django's
+        cache, and are stored alongside a fingerprint of the fields they
+        were built from, so an entry built from stale field values is
+        never served.
+
+        """
+        if self.pk is None:
+            return self._full_qs()
+
+        fingerprint = self._qs_fingerprint()
+        key = self._compiled_qs_key()
+        entry = compiled_qs_cache.get(key)
+        if entry is None or entry[0] != fingerprint:
+            entry = cache.get(key)
+            if entry is None or entry[0] != fingerprint:
+                entry = (fingerprint, self._full_qs())
+                cache.set(key, entry, QS_CACHE_TIMEOUT)
+            compiled_qs_cache.set(key, entry)
+
+        return entry[1]
+
+    def _qs_fingerprint(self):
+        """Hash the values the query string is built from."""
+        values = [u'%s' % (value or u'') for value in self._qs_source_values()]
+        return hashlib.md5(u'\x00'.join(values).encode('utf-8')).hexdigest()
+
+    def _qs_source_values(self):
+        """
+        Return the values the query string is built from: those of
+        `query_source_fields`. Override to add values that are not plain
+        attributes, such as related objects.
+
+        """
+        return [getattr(self, field, None)
+                for field in self.query_source_fields]
+
+    def _compiled_qs_key(self):
+        return 'saved_search:qs:%s.%s:%s' % (self._meta.app_label,
+                                             self._meta.object_name, self.pk)
+
+    def _invalidate_compiled_qs(self):
+        if self.pk is None:
+            return
+
+        key = self._compiled_qs_key()
+        compiled_qs_cache.delete(key)
+        cache.delete(key)
+
     def get_sqs(self, *args, **kwargs):
         """Return a list of results."""
         raise NotImplementedError
 
     def _escape(self):
-        """Escape special characters."""
+        """Escape special characters. See `solr_escape`."""
         raise NotImplementedError
 
     def _make_qs(self):
@@ -0,0 +1,779 @@
+import json
+import pickle
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs, urlparse
+
+from django.db import models
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+
+from haystack import connections
+from haystack.models import SearchResult
+from haystack.query import SQ
+
+from pysolr import SolrError
+
+from saved_search.cache import LRUCache
+from saved_search.groupsearch import (FacetView, FilterQueryRegistry,
+                                      GroupQuerySet, GroupQueries,
+                                      GroupQueryError,
+                                      SolrGroupSearchQuery,
+                                      canonical_group_query,
+                                      hoist_common_clauses, split_conjuncts)
+from saved_search.models import BaseSavedSearch
+
+
+def group_queryset():
+    return GroupQuerySet(query=SolrGroupSearchQuery())
+
+
+def grouped_response(params):
+    """
+    Returns a grouped Solr response with one document per group query in
+    `params`; the ith group matches i + 1 documents.
+
+    """
+    grouped = {}
+    highlighting = {}
+    for i, qfrag in enumerate(params.get('group.query', [])):
+        doc_id = 'jobs.job.%d' % i
+        grouped[qfrag] = {'doclist': {'numFound': i + 1, 'start': 0,
+                                      'docs': [{
+            'id': doc_id, 'django_ct': 'jobs.job', 'django_id': str(i),
+            'title': 'Job %d' % i, 'score': 1.0}]}}
+        highlighting[doc_id] = {'text': ['<em>job</em> %d' % i]}
+    return {'responseHeader': {'status': 0, 'QTime': 1},
+            'response': {'numFound': 0, 'start': 0, 'docs': []},
+            'grouped': grouped, 'highlighting': highlighting}
+
+
+class StubSolrHandler(BaseHTTPRequestHandler):
+    """
+    Answers /select/ requests with a grouped response holding one document
+    per group query, or with the next of the server's queued responses.
+    Requests for a group query in the server's `delays` are answered that
+    many seconds late.
+
+    """
+    # Keep connections alive, as Solr's servlet container does.
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.respond(urlparse(self.path).query)
+
+    def do_POST(self):
+        self.respond(self.rfile.read(int(self.headers['Content-Length'])))
+
+    def respond(self, query):
+        params = parse_qs(query)
+        self.server.requests.append((self.command, params))
+        time.sleep(max([self.server.delays.get(qfrag, 0)
+                        for qfrag in params.get('group.query', [])] or [0]))
+        if self.server.responses:
+            status, body = self.server.responses.pop(0)
+        else:
+            status, body = 200, json.dumps(grouped_response(params))
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubSolrServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubSolrTestCase(SimpleTestCase):
+    """
+    Runs a stand-in Solr on a local port for the duration of a test, and
+    registers a haystack connection to it, named after the test so that
+    tests don't share pools or caches.
+
+    """
+    engine = 'saved_search.groupsearch.SolrGrpEngine'
+    backend_options = {}
+
+    def setUp(self):
+        self.server = StubSolrServer(('127.0.0.1', 0), StubSolrHandler)
+        self.server.requests = []
+        self.server.responses = []
+        self.server.delays = {}
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.01})
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.alias = self.id()
+        url = 'http://127.0.0.1:%d/solr' % self.server.server_port
+        connections.connections_info[self.alias] = dict(
+            self.backend_options, ENGINE=self.engine, RETRY_BACKOFF=0,
+            URL=url)
+        self.backend = connections[self.alias].get_backend()
+
+    def tearDown(self):
+        del connections.connections_info[self.alias]
+        connections._connections.pop(self.alias, None)
+        # Close kept-alive connections, so the server's handlers finish.
+        self.backend.pool.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def queryset(self):
+        return GroupQuerySet(using=self.alias)
+
+    def search(self, group_query, **kwargs):
+        return self.backend.search('*:*', group_query=group_query,
+                                   limit_to_registered_models=False, **kwargs)
+
+
+class GroupQueriesCopyTestCase(SimpleTestCase):
+    def test_copy_shares_storage_until_written(self):
+        base = GroupQueries()
+        base.add('a:1')
+        copy = base.copy()
+        self.assertTrue(copy._entries is base._entries)
+
+        copy.add('b:2')
+        self.assertFalse(copy._entries is base._entries)
+        self.assertEqual(list(base), ['a:1'])
+        self.assertEqual(list(copy), ['a:1', 'b:2'])
+
+    def test_writing_to_original_does_not_leak_into_copy(self):
+        base = GroupQueries()
+        base.add('a:1')
+        copy = base.copy()
+
+        base.add('b:2')
+        self.assertEqual(list(base), ['a:1', 'b:2'])
+        self.assertEqual(list(copy), ['a:1'])
+
+    def test_adding_existing_query_does_not_copy(self):
+        base = GroupQueries()
+        base.add('a:1')
+        copy = base.copy()
+
+        copy.add('a:1')
+        self.assertTrue(copy._entries is base._entries)
+
+
+class GroupQuerySetCloneTestCase(SimpleTestCase):
+    def test_clone_shares_group_queries(self):
+        base = group_queryset().group_query(SQ(content='base'))
+        clone = base._clone()
+        self.assertTrue(clone.query.group_queries._entries is
+                        base.query.group_queries._entries)
+
+    def test_chained_group_queries_stay_isolated(self):
+        base = group_queryset().group_query(SQ(content='base'))
+        first = base.group_query(SQ(content='first'))
+        second = base.group_query(SQ(content='second'))
+
+        base_queries = list(base.query.group_queries)
+        self.assertEqual(len(base_queries), 1)
+        self.assertEqual(list(first.query.group_queries)[:1], base_queries)
+        self.assertEqual(list(second.query.group_queries)[:1], base_queries)
+        self.assertEqual(len(first.query.group_queries), 2)
+        self.assertEqual(len(second.query.group_queries), 2)
+        self.assertNotEqual(list(first.query.group_queries),
+                            list(second.query.group_queries))
+
+    def test_base_changes_do_not_leak_into_clones(self):
+        base = group_queryset().group_query(SQ(content='base'))
+        clone = base._clone()
+
+        base.query.add_raw_group_query('text:later')
+        self.assertTrue('text:later' in base.query.group_queries)
+        self.assertFalse('text:later' in clone.query.group_queries)
+        self.assertEqual(len(clone.query.group_queries), 1)
+
+
+class SearchGroupTestCase(StubSolrTestCase):
+    def test_dict_interface(self):
+        group = self.search(['title:a'])[0]
+        self.assertEqual(group['hits'], 1)
+        self.assertEqual(group.get('tag'), None)
+        self.assertTrue('hits' in group)
+        self.assertFalse('missing' in group)
+        self.assertEqual(set(group.keys()), set(['group', 'results', 'hits',
+                                                 'facets', 'tag',
+                                                 'spelling_suggestion',
+                                                 'saved_search']))
+        self.assertEqual(dict((key, group[key]) for key in group.keys())
+                         ['group'], 'title:a')
+
+    def test_pickle(self):
+        groups = self.search(['title:a', 'title:b'])
+        for protocol in (0, pickle.HIGHEST_PROTOCOL):
+            unpickled = pickle.loads(pickle.dumps(groups, protocol))
+            self.assertEqual([g.group for g in unpickled],
+                             ['title:a', 'title:b'])
+            self.assertEqual([g.hits for g in unpickled], [1, 2])
+            self.assertEqual(unpickled[1].results[0].title, 'Job 1')
+            self.assertEqual(unpickled[1].results[0].pk, '1')
+            self.assertEqual(unpickled[0].facets, groups[0].facets)
+
+
+class FacetViewTestCase(SimpleTestCase):
+    pairs = [('java', 3), ('python', 1)]
+
+    def views(self):
+        return [FacetView(['java', 3, 'python', 1]),
+                FacetView([['java', 3], ['python', 1]], 'arrarr'),
+                FacetView({'java': 3, 'python': 1}, 'map')]
+
+    def test_iteration(self):
+        flat, arrarr, map_ = self.views()
+        self.assertEqual(list(flat), self.pairs)
+        self.assertEqual(list(arrarr), self.pairs)
+        self.assertEqual(sorted(map_), self.pairs)
+        for view in self.views():
+            self.assertEqual(len(view), 2)
+
+    def test_indexing(self):
+        for view in self.views()[:2]:
+            self.assertEqual(view[0], ('java', 3))
+            self.assertEqual(view[-1], ('python', 1))
+            self.assertEqual(view[1:], [('python', 1)])
+            self.assertRaises(IndexError, lambda: view[2])
+        map_ = self.views()[2]
+        self.assertEqual(sorted([map_[0], map_[1]]), self.pairs)
+        self.assertRaises(IndexError, lambda: map_[2])
+
+    def test_equality(self):
+        flat, arrarr, map_ = self.views()
+        self.assertEqual(flat, arrarr)
+        self.assertEqual(flat, self.pairs)
+        self.assertNotEqual(flat, self.pairs[:1])
+        self.assertFalse(flat == None)
+        self.assertTrue(flat != None)
+        self.assertFalse(flat == 3)
+
+    def test_pickle(self):
+        for protocol in (0, 1, pickle.HIGHEST_PROTOCOL):
+            for view in self.views():
+                unpickled = pickle.loads(pickle.dumps(view, protocol))
+                self.assertEqual(sorted(unpickled), sorted(view))
+
+
+class ResponseFormatTestCase(StubSolrTestCase):
+    """
+    Facets and the spelling suggestion are read from responses in each
+    json.nl format.
+
+    """
+    backend_options = {'INCLUDE_SPELLING': True}
+    responses = {
+        'flat': {
+            'facet_fields': {'title': ['java', 3, 'python', 1]},
+            'suggestions': ['jav', {'numFound': 1, 'suggestion': ['java']},
+                            'collation', 'java'],
+        },
+        'arrarr': {
+            'facet_fields': {'title': [['java', 3], ['python', 1]]},
+            'suggestions': [['jav', {'numFound': 1, 'suggestion': ['java']}],
+                            ['collation', 'java']],
+        },
+        'map': {
+            'facet_fields': {'title': {'java': 3, 'python': 1}},
+            'suggestions': {'jav': {'numFound': 1, 'suggestion': ['java']},
+                            'collation': 'java'},
+        },
+    }
+
+    def search_format(self, json_nl):
+        self.backend.facet_json_nl = json_nl
+        response = grouped_response({'group.query': ['title:a']})
+        response['facet_counts'] = {
+            'facet_fields': self.responses[json_nl]['facet_fields']}
+        response['spellcheck'] = {
+            'suggestions': self.responses[json_nl]['suggestions']}
+        self.server.responses.append((200, json.dumps(response)))
+        return self.search(['title:a'], facets={'title': {}},
+                           spelling_query='jav')
+
+    def test_formats(self):
+        for json_nl in ('flat', 'arrarr', 'map'):
+            group = self.search_format(json_nl)[0]
+            self.assertEqual(sorted(group.facets['fields']['title']),
+                             [('java', 3), ('python', 1)])
+            self.assertEqual(group.spelling_suggestion, 'java')
+
+    def test_pickle_with_facets(self):
+        for json_nl in ('flat', 'arrarr', 'map'):
+            groups = self.search_format(json_nl)
+            for protocol in (0, 1, pickle.HIGHEST_PROTOCOL):
+                unpickled = pickle.loads(pickle.dumps(groups, protocol))
+                self.assertEqual(
+                    sorted(unpickled[0].facets['fields']['title']),
+                    [('java', 3), ('python', 1)])
+                self.assertEqual(unpickled[0].spelling_suggestion, 'java')
+
+
+class HighlightTestCase(StubSolrTestCase):
+    def test_highlighting_is_attached_to_documents(self):
+        groups = self.search(['title:a', 'title:b'], highlight=True)
+        method, params = self.server.requests[0]
+        self.assertEqual(params['hl'], ['true'])
+        self.assertEqual(groups[0].results[0].highlighted,
+                         {'text': ['<em>job</em> 0']})
+        self.assertEqual(groups[1].results[0].highlighted,
+                         {'text': ['<em>job</em> 1']})
+
+    def test_no_highlighting_unless_requested(self):
+        groups = self.search(['title:a'])
+        method, params = self.server.requests[0]
+        self.assertFalse('hl' in params)
+        self.assertEqual(groups[0].results[0].highlighted, None)
+
+    def test_values_are_not_highlighted(self):
+        self.search(['title:a'], highlight=True, fields='title',
+                    values='dict')
+        method, params = self.server.requests[0]
+        self.assertFalse('hl' in params)
+
+
+class PooledSolrTestCase(StubSolrTestCase):
+    backend_options = {'POST_THRESHOLD': 200, 'SILENTLY_FAIL': False}
+
+    def test_short_searches_are_sent_as_get(self):
+        groups = self.search(['title:a'])
+        self.assertEqual(self.server.requests[0][0], 'GET')
+        self.assertEqual(self.backend.conn.last_method, 'GET')
+        self.assertEqual(groups[0].hits, 1)
+
+    def test_long_searches_are_sent_as_post(self):
+        group_query = ['title:%s' % ('x' * 100), 'title:%s' % ('y' * 100)]
+        groups = self.search(group_query)
+        method, params = self.server.requests[0]
+        self.assertEqual(method, 'POST')
+        self.assertEqual(self.backend.conn.last_method, 'POST')
+        self.assertEqual(params['group.query'], group_query)
+        self.assertEqual([g.group for g in groups], group_query)
+
+    def test_connections_are_reused(self):
+        for i in range(3):
+            self.search(['title:a'])
+        stats = self.backend.pool_stats()
+        self.assertEqual(stats['requests'], 3)
+        host = stats['hosts']['127.0.0.1:%d' % self.server.server_port]
+        self.assertEqual(host, {'connections': 1, 'requests': 3})
+
+    def test_server_errors_are_retried(self):
+        self.server.responses.append((503, 'Service Unavailable'))
+        groups = self.search(['title:a'])
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(groups[0].hits, 1)
+        self.assertEqual(self.backend.pool_stats()['retries'], 1)
+
+    def test_bad_requests_are_not_retried(self):
+        self.server.responses.append((400, 'undefined field: nope'))
+        self.assertRaises(SolrError, self.search, ['nope:a'])
+        self.assertEqual(len(self.server.requests), 1)
+        stats = self.backend.pool_stats()
+        self.assertEqual((stats['retries'], stats['failures']), (0, 1))
+
+
+class ResultCacheTestCase(StubSolrTestCase):
+    backend_options = {'RESULT_CACHE_SIZE': 10}
+
+    def test_cache_hits_send_no_request(self):
+        self.search(['title:a'])
+        self.assertEqual(self.backend.conn.last_method, 'GET')
+
+        groups = self.search(['title:a'])
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.backend.conn.last_method, None)
+        self.assertEqual(groups[0].hits, 1)
+
+
+class SearchParamsTestCase(StubSolrTestCase):
+    def build(self, **kwargs):
+        return self.backend.build_params('*:*', group_query=['title:a'],
+                                         limit_to_registered_models=False,
+                                         **kwargs)
+
+    def test_json_round_trip(self):
+        for result_class in (None, SearchResult):
+            params = self.build(result_class=result_class)
+            restored = params.from_json(params.to_json())
+            self.assertEqual(restored, params)
+            self.assertEqual(hash(restored), hash(params))
+            self.assertEqual(restored.options['result_class'], result_class)
+
+    def test_diff_covers_options(self):
+        params = self.build()
+        other = params.replace(result_class=SearchResult)
+        self.assertNotEqual(params, other)
+        self.assertEqual(params.diff(other),
+                         {'options.result_class': (None, SearchResult)})
+        self.assertEqual(params.diff(params), {})
+
+
+@override_settings(DEBUG=True)
+class QueryLogTestCase(StubSolrTestCase):
+    backend_options = {'POST_THRESHOLD': 200}
+
+    def test_concurrent_searches_log_their_own_method(self):
+        short, long = ['title:a'], ['title:%s' % ('x' * 300)]
+        test = self
+
+        class InterleavingLog(list):
+            # Runs a search on another thread right after the first entry
+            # is logged, as a concurrent search might.
+            def append(self, entry):
+                super(InterleavingLog, self).append(entry)
+                if len(self) == 1:
+                    thread = threading.Thread(target=test.search,
+                                              args=(long,))
+                    thread.start()
+                    thread.join(5)
+
+        connections[self.alias].queries = InterleavingLog()
+        self.search(short)
+
+        queries = connections[self.alias].queries
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(queries[0]['additional_kwargs']['group_query'],
+                         short)
+        self.assertEqual(queries[0]['method'], 'GET')
+        self.assertEqual(queries[1]['additional_kwargs']['group_query'],
+                         long)
+        self.assertEqual(queries[1]['method'], 'POST')
+
+
+class FilterQueryRegistryTestCase(SimpleTestCase):
+    def test_usage_is_counted(self):
+        registry = FilterQueryRegistry({'buid:1': {'cost': 50}})
+        self.assertEqual(registry.build(['b:1', 'buid:1']),
+                         ['b:1', '{!cost=50}buid:1'])
+        registry.build(['b:1'])
+        stats = registry.stats()
+        self.assertEqual(stats['usage'], {'b:1': 2, 'buid:1': 1})
+        self.assertEqual(stats['reused'], ['b:1'])
+
+    def test_usage_is_bounded(self):
+        registry = FilterQueryRegistry(usage_size=2)
+        for i in range(10):
+            registry.build(['text:%d' % i])
+        registry.build(['text:9'])
+        self.assertEqual(registry.stats()['usage'],
+                         {'text:8': 1, 'text:9': 2})
+
+
+class HoistCommonClausesTestCase(SimpleTestCase):
+    def test_split_explicit_conjunction(self):
+        self.assertEqual(split_conjuncts('(title:a AND country:US)'),
+                         ('', ['title:a', 'country:US']))
+        self.assertEqual(split_conjuncts('{!tag="1"} a  AND\tb'),
+                         ('{!tag="1"}', ['a', 'b']))
+        self.assertEqual(split_conjuncts('title:"a AND b" AND c:(d OR e)'),
+                         ('', ['title:"a AND b"', 'c:(d OR e)']))
+        self.assertEqual(split_conjuncts('date:[1 TO 2] AND c'),
+                         ('', ['date:[1 TO 2]', 'c']))
+
+    def test_no_split_without_explicit_and(self):
+        for qfrag in ['java developer AND country:US',
+                      'a OR b AND c',
+                      'a AND NOT b',
+                      'a && b',
+                      'a AND -b',
+                      '+a AND b',
+                      'a AND !b',
+                      'a\\ b AND c d',
+                      'a AND',
+                      'AND a']:
+            self.assertEqual(split_conjuncts(qfrag), ('', [qfrag]), qfrag)
+
+    def test_no_split_for_other_parsers(self):
+        for qfrag in ['{!dismax qf=title}a AND b',
+                      '{!type=edismax}a AND b',
+                      '{!lucene v=$qq}a AND b',
+                      '{!lucene df=text}a AND b',
+                      '{!q.op=OR}a AND b']:
+            self.assertEqual(split_conjuncts(qfrag), ('', [qfrag]), qfrag)
+        for prefix in ['{!lucene}', '{!type=lucene tag=x}', '{!tag=x}']:
+            self.assertEqual(split_conjuncts(prefix + 'a AND b'),
+                             (prefix, ['a', 'b']), prefix)
+
+    def test_hoist(self):
+        common, reduced = hoist_common_clauses(
+            ['title:a AND country:US', 'title:b AND country:US'])
+        self.assertEqual(common, ['country:US'])
+        self.assertEqual(reduced, {'title:a AND country:US': 'title:a',
+                                   'title:b AND country:US': 'title:b'})
+
+    def test_no_hoist_from_default_operator(self):
+        self.assertEqual(hoist_common_clauses(
+            ['java developer AND country:US', 'python AND country:US']),
+            ([], {}))
+
+    def test_no_hoist_from_other_parsers(self):
+        self.assertEqual(hoist_common_clauses(
+            ['{!dismax}a AND country:US', 'b AND country:US']), ([], {}))
+        self.assertEqual(hoist_common_clauses(
+            ['{!df=title}java AND a:1', '{!df=body}java AND b:2']), ([], {}))
+
+
+class CanonicalGroupQueryTestCase(SimpleTestCase):
+    def test_clause_whitespace_is_collapsed(self):
+        self.assertEqual(canonical_group_query(' ( a:1  AND\tb:2 ) '),
+                         'a:1 AND b:2')
+        self.assertEqual(canonical_group_query('((a:1) AND (b:2))'),
+                         '(a:1) AND (b:2)')
+
+    def test_phrases_and_escapes_are_kept(self):
+        self.assertEqual(canonical_group_query('title:"foo  bar"'),
+                         'title:"foo  bar"')
+        self.assertEqual(canonical_group_query('a\\  b'), 'a\\  b')
+        self.assertEqual(canonical_group_query('a\\ \\ b'), 'a\\ \\ b')
+        self.assertEqual(canonical_group_query('(a\\ )'), 'a\\ ')
+        self.assertNotEqual(canonical_group_query('a\\  b'),
+                            canonical_group_query('a\\ b'))
+
+    def test_saved_searches_with_same_query_share_a_group(self):
+        class SavedSearch(object):
+            def __init__(self, pk, qs):
+                self.pk, self.qs = pk, qs
+
+            def get_compiled_qs(self):
+                return self.qs
+
+        saved_searches = [SavedSearch(1, 'title:a'),
+                          SavedSearch(2, '(title:a)'),
+                          SavedSearch(3, 'title:"a  b"'),
+                          SavedSearch(4, 'title:"a b"')]
+        sqs = group_queryset().for_saved_searches(saved_searches)
+        group_queries = sqs.query.group_queries
+        self.assertEqual(list(group_queries),
+                         ['title:a', 'title:"a  b"', 'title:"a b"'])
+        self.assertEqual([tag for tag, saved_search
+                          in group_queries.members('title:a')], ['1', '2'])
+        self.assertEqual(sqs.group_query_stats(),
+                         {'added': 4, 'unique': 3, 'dedup_ratio': 0.25})
+        self.assertEqual(sqs.query.get_group_count(), 4)
+
+
+class KeywordSavedSearch(BaseSavedSearch):
+    keywords = models.CharField(max_length=100, blank=True)
+
+    query_source_fields = BaseSavedSearch.query_source_fields + ('keywords',)
+
+    def _full_qs(self):
+        return ' AND '.join('text:%s' % value
+                            for value in (self.title, self.keywords) if value)
+
+    class Meta:
+        app_label = 'saved_search'
+
+
+class CompiledQueryStringTestCase(TestCase):
+    def test_saving_changes_compiled_qs(self):
+        saved_search = KeywordSavedSearch.objects.create(name='Nursing',
+                                                         title='nurse',
+                                                         keywords='rn')
+        self.assertEqual(saved_search.get_compiled_qs(),
+                         'text:nurse AND text:rn')
+
+        saved_search = KeywordSavedSearch.objects.get(pk=saved_search.pk)
+        saved_search.keywords = 'lpn'
+        saved_search.save()
+        self.assertEqual(saved_search.get_compiled_qs(),
+                         'text:nurse AND text:lpn')
+        self.assertEqual(KeywordSavedSearch.objects.get(
+            pk=saved_search.pk).get_compiled_qs(), 'text:nurse AND text:lpn')
+
+    def test_unsaved_changes_to_source_fields_are_seen(self):
+        saved_search = KeywordSavedSearch.objects.create(name='Nursing',
+                                                         title='nurse')
+        self.assertEqual(saved_search.get_compiled_qs(), 'text:nurse')
+
+        saved_search.keywords = 'rn'
+        self.assertEqual(saved_search.get_compiled_qs(),
+                         'text:nurse AND text:rn')
+
+
+class LRUCacheGetOrSetTestCase(SimpleTestCase):
+    def run_in_thread(self, func, *args):
+        thread = threading.Thread(target=func, args=args)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def test_identical_calls_wait_for_the_first(self):
+        cache = LRUCache()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'value'
+
+        results = []
+        first = self.run_in_thread(
+            lambda: results.append(cache.get_or_set('key', slow)))
+        started.wait(5)
+        second = self.run_in_thread(
+            lambda: results.append(cache.get_or_set('key', slow)))
+        # Give the second call time to start waiting.
+        time.sleep(0.05)
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(results, ['value', 'value'])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_different_keys_do_not_wait(self):
+        cache = LRUCache()
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'slow'
+
+        thread = self.run_in_thread(cache.get_or_set, 'slow', slow)
+        started.wait(5)
+        try:
+            # Would block until `release` if keys shared a lock.
+            self.assertEqual(cache.get_or_set('fast', lambda: 'fast'),
+                             'fast')
+            self.assertFalse(release.is_set())
+        finally:
+            release.set()
+            thread.join(5)
+        self.assertEqual(cache.get('slow'), 'slow')
+
+    def test_waiters_take_over_after_a_failure(self):
+        cache = LRUCache()
+        started, release = threading.Event(), threading.Event()
+
+        def failing():
+            started.set()
+            release.wait(5)
+            raise IOError('down')
+
+        errors = []
+
+        def first():
+            try:
+                cache.get_or_set('key', failing)
+            except IOError as e:
+                errors.append(e)
+
+        thread = self.run_in_thread(first)
+        started.wait(5)
+        results = []
+        waiter = self.run_in_thread(
+            lambda: results.append(cache.get_or_set('key', lambda: 'ok')))
+        release.set()
+        thread.join(5)
+        waiter.join(5)
+
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(results, ['ok'])
+        self.assertEqual(cache._in_flight, {})
+
+
+class ChunkedQueryTestCase(StubSolrTestCase):
+    group_queries = ['title:a', 'title:b', 'title:c']
+
+    def queryset(self):
+        sqs = super(ChunkedQueryTestCase, self).queryset()
+        for qfrag in self.group_queries:
+            sqs.query.add_raw_group_query(qfrag)
+        return sqs
+
+
+@override_settings(HAYSTACK_LIMIT_TO_REGISTERED_MODELS=False)
+class ParallelChunksTestCase(ChunkedQueryTestCase):
+    # One group query per chunk.
+    backend_options = {'GROUP_QUERY_MAX_LENGTH': 20, 'PARALLEL_WORKERS': 4,
+                       'PARALLEL_TIMEOUT': 0.5}
+
+    def test_chunks_run_concurrently(self):
+        for qfrag in self.group_queries:
+            self.server.delays[qfrag] = 0.2
+        start = time.time()
+        groups = self.queryset().query.get_results()
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual([g.group for g in groups], self.group_queries)
+
+    def test_deadline_returns_finished_chunks_when_failing_silently(self):
+        self.server.delays['title:b'] = 1
+        start = time.time()
+        groups = self.queryset().query.get_results()
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual([g.group for g in groups], ['title:a', 'title:c'])
+
+    def test_deadline_raises_unless_failing_silently(self):
+        self.backend.silently_fail = False
+        self.server.delays['title:b'] = 1
+        self.assertRaises(GroupQueryError,
+                          self.queryset().query.get_results)
+
+
+@override_settings(HAYSTACK_LIMIT_TO_REGISTERED_MODELS=False)
+class QueuedChunksTestCase(ChunkedQueryTestCase):
+    backend_options = {'GROUP_QUERY_MAX_LENGTH': 20, 'PARALLEL_WORKERS': 1,
+                       'PARALLEL_TIMEOUT': 0.2}
+
+    def test_queued_chunks_are_cancelled_at_deadline(self):
+        self.server.delays['title:a'] = 0.4
+        groups = self.queryset().query.get_results()
+        self.assertEqual(groups, [])
+        # Let the running chunk finish; the queued ones never start.
+        time.sleep(0.4)
+        self.assertEqual(len(self.server.requests), 1)
+
+
+@override_settings(HAYSTACK_LIMIT_TO_REGISTERED_MODELS=False)
+class AsyncBackendTestCase(StubSolrTestCase):
+    engine = 'saved_search.groupsearch.SolrGrpAsyncEngine'
+    backend_options = {'ASYNC_WORKERS': 2}
+
+    def test_aexecute(self):
+        sqs = self.queryset()
+        sqs.query.add_raw_group_query('title:a')
+        sqs.query.add_raw_group_query('title:b')
+        future = sqs.aexecute()
+        groups = future.result(5)
+        self.assertEqual([g.group for g in groups], ['title:a', 'title:b'])
+        self.assertEqual([g.hits for g in groups], [1, 2])
+        # The queryset itself is left unevaluated.
+        self.assertFalse(sqs.query.has_run())
+
+    def test_aexecute_runs_searches_concurrently(self):
+        self.server.delays['title:a'] = 0.3
+        futures = []
+        start = time.time()
+        for i in range(2):
+            sqs = self.queryset()
+            sqs.query.add_raw_group_query('title:a')
+            futures.append(sqs.aexecute())
+        for future in futures:
+            self.assertEqual(future.result(5)[0].group, 'title:a')
+        self.assertTrue(time.time() - start < 0.6)
+
+    def test_search_async(self):
+        future = self.backend.search_async(
+            '*:*', group_query=['title:a'], limit_to_registered_models=False)
+        self.assertEqual(future.result(5)[0].hits, 1)
+
+    def test_aexecute_requires_async_backend(self):
+        sqs = group_queryset()
+        sqs.query.add_raw_group_query('title:a')
+        self.assertRaises(GroupQueryError, sqs.aexecute)
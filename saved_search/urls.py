@@ -7,6 +7,18 @@ from saved_search.views import SavedSearchListView
 
 urlpatterns = patterns('',
                        url(r'^login/', 'saved_search.views.login', name="login"),
+                       url(r'^locations/$', 'saved_search.views.location_data',
+                           name="location_data"),
+                       url(r'^locations/countries/$',
+                           'saved_search.views.location_data', {'index': True},
+                           name="location_index"),
+                       url(r'^locations/countries/(?P<country>[^/]+)/$',
+                           'saved_search.views.location_data',
+                           name="location_country"),
+                       url(r'^locations/countries/(?P<country>[^/]+)/'
+                           r'(?P<state>[^/]+)/$',
+                           'saved_search.views.location_data',
+                           name="location_state"),
                        url(r'^(?P<username>.*)/(?P<svdsrch_id>[0-9]+)/',
                            'saved_search.views.saved_search_view',
                            name="edit_item"),
@@ -1,11 +1,18 @@
+import datetime
+import hashlib
 import json
+import time
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User, Group
-from django.http import Http404
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
 from django.shortcuts import redirect, render_to_response, get_object_or_404
 from django.template import RequestContext
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from django.views.generic import ListView
 
 from haystack.query import SearchQuerySet
@@ -13,6 +20,22 @@ from haystack.query import SearchQuerySet
 from saved_search.forms import SavedSearchForm, LoginForm
 from saved_search.models import SavedSearch
 
+LOCATION_CACHE_KEY = 'saved_search:locations'
+LOCATION_CACHE_TIMEOUT = getattr(settings,
+                                 'SAVED_SEARCH_LOCATION_CACHE_TIMEOUT', 3600)
+# Countries with more cities than this are served one state at a time.
+LOCATION_STATE_SHARD_SIZE = getattr(settings,
+                                    'SAVED_SEARCH_LOCATION_STATE_SHARD_SIZE',
+                                    2000)
+# Bodies are cached in chunks of at most this many characters, keeping every
+# cache item under memcached's default 1MB item size limit.
+LOCATION_CHUNK_SIZE = getattr(settings, 'SAVED_SEARCH_LOCATION_CHUNK_SIZE',
+                              512 * 1024)
+# How long a rebuild of the location tree may hold the rebuild lock, and so
+# how long other requests wait for it before rebuilding themselves.
+LOCATION_REBUILD_TIMEOUT = getattr(settings,
+                                   'SAVED_SEARCH_LOCATION_REBUILD_TIMEOUT', 60)
+
 
 class SavedSearchListView(ListView):
     context_object_name = "svd_searches"
@@ -87,67 +110,281 @@ def _update_tags(item, form):
         item.keyword.add(tag)
     return item
 
+def _location_etag(request, *args, **kwargs):
+    shard = _request_location_shard(request, **kwargs)
+    return shard and shard['etag']
+
+
+def _location_last_modified(request, *args, **kwargs):
+    shard = _request_location_shard(request, **kwargs)
+    return shard and shard['last_modified']
+
+
+def _request_location_shard(request, **kwargs):
+    """
+    Look up the shard a location request is for once, and keep it on the
+    request for the ETag, Last-Modified and view functions to share.
+
+    """
+    if not hasattr(request, '_location_shard'):
+        request._location_shard = _cached_location_shard(
+            *_location_path(**kwargs))
+    return request._location_shard
+
+
+def _location_path(index=False, country=None, state=None):
+    """Map location URL arguments to the path of a cached shard."""
+    if index:
+        return ('countries',)
+    elif country is None:
+        return ()
+    elif state is None:
+        return ('countries', country)
+    return ('countries', country, state)
+
+
+@condition(etag_func=_location_etag,
+           last_modified_func=_location_last_modified)
+def location_data(request, **kwargs):
+    """
+    Serve the location dialogue's JSON with ETag and Last-Modified headers,
+    answering conditional GETs with a 304 when the data has not changed.
+
+    With no arguments the whole tree is served. `index=True` serves the
+    country index, and `country` (plus `state`, for countries whose states
+    are sharded) serves a single shard of the tree, so the dialogue only
+    downloads the part of the tree the user drills into.
+
+    """
+    shard = _request_location_shard(request, **kwargs)
+    if shard is None:
+        raise Http404
+
+    response = HttpResponse(shard['body'], content_type='application/json')
+    patch_cache_control(response, public=True, max_age=LOCATION_CACHE_TIMEOUT)
+    return response
+
+
+def _location_cache_key(*path):
+    if not path:
+        return LOCATION_CACHE_KEY
+    path = u'\x00'.join(path).encode('utf-8')
+    return '%s:%s' % (LOCATION_CACHE_KEY, hashlib.md5(path).hexdigest())
+
+
+def _cached_location_shard(*path):
+    """
+    Return the pre-serialized JSON of a part of the location tree, along
+    with its ETag and Last-Modified date, or None if there is no such part.
+
+    `path` is empty for the whole tree, ('countries',) for the country
+    index, ('countries', country) for a country, and ('countries', country,
+    state) for a state of a country with more than
+    SAVED_SEARCH_LOCATION_STATE_SHARD_SIZE cities.
+
+    """
+    shard = _get_location_shard(path)
+    if shard is None:
+        # Only rebuild for paths that existed in the last build, so that
+        # requests for unknown locations don't each trigger a rebuild.
+        paths = cache.get(LOCATION_CACHE_KEY + ':paths')
+        if paths is None or path in paths:
+            shard = _rebuild_location_shard(path)
+
+    return shard
+
+
+def _rebuild_location_shard(path):
+    """
+    Rebuild the location tree and return the shard at `path`.
+
+    Only one request at a time rebuilds; the others wait for it to finish
+    and read its shards from the cache, rather than each sending the same
+    facet request to Solr when the cached tree expires. A waiting request
+    whose path turns out not to exist returns None. If the rebuild takes
+    longer than SAVED_SEARCH_LOCATION_REBUILD_TIMEOUT seconds, or its shards
+    did not make it into the cache, waiting requests rebuild themselves.
+
+    """
+    lock_key = LOCATION_CACHE_KEY + ':lock'
+    locked = cache.add(lock_key, 1, LOCATION_REBUILD_TIMEOUT)
+    if not locked:
+        deadline = time.time() + LOCATION_REBUILD_TIMEOUT
+        while cache.get(lock_key) is not None and time.time() < deadline:
+            time.sleep(0.1)
+        shard = _get_location_shard(path)
+        if shard is not None:
+            return shard
+        paths = cache.get(LOCATION_CACHE_KEY + ':paths')
+        if paths is not None and path not in paths:
+            return None
+        locked = cache.add(lock_key, 1, LOCATION_REBUILD_TIMEOUT)
+
+    try:
+        return _build_location_shards().get(path)
+    finally:
+        # Only release the lock if it is ours.
+        if locked:
+            cache.delete(lock_key)
+
+
+def _get_location_shard(path):
+    """
+    Read a shard from the cache, joining its body back together from its
+    chunks. Returns None if the shard or any of its chunks is missing.
+
+    """
+    key = _location_cache_key(*path)
+    shard = cache.get(key)
+    if shard is None:
+        return None
+
+    chunk_keys = _location_chunk_keys(key, shard)
+    chunks = cache.get_many(chunk_keys)
+    if len(chunks) != len(chunk_keys):
+        return None
+
+    shard = dict(shard, body=''.join(chunks[k] for k in chunk_keys))
+    del shard['chunks']
+    return shard
+
+
+def _location_chunk_keys(key, shard):
+    # Chunk keys include the ETag, so the chunks read for a shard always
+    # belong to the same build as the shard itself.
+    return ['%s:%s:%d' % (key, shard['etag'], i)
+            for i in range(shard['chunks'])]
+
+
+def _build_location_shards():
+    """
+    Rebuild the location tree and cache it, whole and as shards. Shards are
+    rebuilt at most once every SAVED_SEARCH_LOCATION_CACHE_TIMEOUT seconds.
+
+    The ETag of the tree and of each shard is a hash of its JSON, and each
+    keeps its Last-Modified date until its ETag changes. A rebuild against
+    an index whose locations have not changed, or have changed elsewhere
+    in the tree, keeps a shard's validators, and clients keep getting 304s.
+
+    """
+    loc_data = _location_tree()
+    bodies = {(): json.dumps(loc_data)}
+
+    index = {}
+    for country, country_data in loc_data['countries'].items():
+        states = country_data['states']
+        city_count = sum(len(s['cities']) for s in states.values())
+        sharded = city_count > LOCATION_STATE_SHARD_SIZE
+        index[country] = {'states': len(states), 'cities': city_count,
+                          'sharded': sharded}
+
+        if sharded:
+            shard = {'sharded': True, 'states': dict(
+                (state, {'cities': len(state_data['cities'])})
+                for state, state_data in states.items())}
+            for state, state_data in states.items():
+                bodies[('countries', country, state)] = json.dumps(state_data)
+        else:
+            shard = country_data
+        bodies[('countries', country)] = json.dumps(shard)
+    bodies[('countries',)] = json.dumps({'countries': index})
+
+    # Versions are kept for much longer than the bodies they describe so
+    # that they survive rebuilds.
+    version_keys = dict((path, _location_cache_key(*path) + ':version')
+                        for path in bodies)
+    versions = cache.get_many(version_keys.values())
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+
+    shards = {}
+    items = {}
+    for path, body in bodies.items():
+        etag = hashlib.md5(body.encode('utf-8')).hexdigest()
+        version = versions.get(version_keys[path])
+        if version is None or version['etag'] != etag:
+            version = {'etag': etag, 'last_modified': now}
+        versions[version_keys[path]] = version
+        shards[path] = dict(version, body=body)
+
+        # The whole tree runs to several megabytes, more than memcached
+        # accepts as one item by default, so bodies are cached in chunks.
+        key = _location_cache_key(*path)
+        chunks = [body[i:i + LOCATION_CHUNK_SIZE]
+                  for i in range(0, len(body), LOCATION_CHUNK_SIZE)] or ['']
+        items[key] = dict(version, chunks=len(chunks))
+        items.update(zip(_location_chunk_keys(key, items[key]), chunks))
+
+    cache.set_many(versions, 60 * 60 * 24 * 7)
+    cache.set_many(items, LOCATION_CACHE_TIMEOUT)
+    cache.set(LOCATION_CACHE_KEY + ':paths', frozenset(shards),
+              LOCATION_CACHE_TIMEOUT)
+    return shards
+
+
 def _location_data(request):
     """
     Convert Solr facet counts to JSON object for consumption by location
     dialogue when creating/editing Saved Searches.
     
     """
-    loc_data = {'countries': {'None': {'states': {'None': {'cities': []}}}}}
+    return json.dumps(_location_tree())
+
+
+def _location_tree():
+    """
+    Build the country/state/city hierarchy used by the location dialogue
+    from a single facet request.
+
+    Each `full_loc` facet value looks like:
+
+        'city::Topeka@@state::Kansas@@country::United States@@location::...'
+
+    and is parsed straight into the tree in one pass, e.g.
+    {
+        "countries": {
+            "United States": {
+                "states": {
+                    "Indiana": {"cities": ["Indy", "Carmel", "Richmond"]},
+                    "Texas"  : {"cities": ["Dallas", "Houston", "Amarillo"]}
+                }
+            },
+            "Argentina": {
+                "states": {
+                    "None": {"cities": ["Buenos Aires"]}
+                }
+            }
+        }
+    }
+
+    There are "None" keys at every geographical level (country/state/city) to
+    capture entries that do not have values in those fields. Mostly this
+    applies to non-Canadian/US locations.
+
+    """
     sqs = SearchQuerySet().facet("full_loc").facet("country").facet_limit(-1)
-    locs = sqs.facet_counts()['fields']['full_loc']
-    countries = sqs.facet_counts()['fields']['country']
-    for loc in locs:
-        loc_tuples = loc[0].split('@@')
-        for atom in loc_tuples:
-            loc_tuples[loc_tuples.index(atom)] = atom.split('::')
-        locs[locs.index(loc)] = dict(loc_tuples)
-    # `locs` now looks like:
-    #
-    # [{'city': 'Topeka',
-    #   'country': 'United States',
-    #   'location': 'Topeka, KS',
-    #   'state': 'Kansas'},
-    #  {'city': 'Indianapolis',
-    #   'country': 'United States',
-    #   'location': 'Indianapolis, IN',
-    #   'state': 'Indiana'},
-    #   ...
-    #   etc.]
-
-    # Next two iterations structure the data in `locs` to be hierarchical, e.g.
-    # {
-    #	 "countries": {
-    #		 "United States": {
-    #			 "states": {
-    #				 "Indiana": {"cities": ["Indy", "Carmel", "Richmond"]},
-    #				 "Texas"  : {"cities": ["Dallas", "Houston", "Amarillo"]},
-    #				 "Ohio"   : {"cities": ["Cleveland", "Columbus", "Cincy"]}		
-    #			 }
-    #		 },
-    #		 "Argentina": {
-    #                    "states": {
-    #                            "None": {"cities": ["Sao Paulo", "Buenos Ares"]}
-    #		 }
-    # 	 }
-    # }
-    #
-    # There are "None" keys at every geographical level (country/state/city) to
-    # capture entries that do not have values in those fields. Mostly this
-    # applies to non-Canadian/US locations.
-        
-    for country in countries:
-        loc_data['countries'][country] = {'states': {'None': {'cities': []}}}
-
-    for loc in locs:
-        state = loc['state']
-        # Drill down to the 'state' key of a `locs` member object.
-        state_key = loc_data['countries'][loc['country']]['states']
-        if not loc_data['countries'][loc['country']]['states'].get(state):
-            state_key[state] = {'cities': []}
-        state_key['cities'].append(loc['city'])
-        
-    return json.dumps(loc_data)
-            
-            
-        
+    facet_fields = sqs.facet_counts()['fields']
+
+    countries = {}
+    for country, count in [('None', 0)] + list(facet_fields['country']):
+        countries[country] = {'states': {'None': {'cities': []}}}
+
+    for loc, count in facet_fields['full_loc']:
+        city = state = country = 'None'
+        for atom in loc.split('@@'):
+            key, sep, value = atom.partition('::')
+            if key == 'city':
+                city = value or 'None'
+            elif key == 'state':
+                state = value or 'None'
+            elif key == 'country':
+                country = value or 'None'
+
+        states = countries.setdefault(country,
+                                      {'states': {'None': {'cities': []}}})
+        states = states['states']
+        if state not in states:
+            states[state] = {'cities': []}
+        states[state]['cities'].append(city)
+
+    return {'countries': countries}
+